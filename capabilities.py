@@ -0,0 +1,85 @@
+import os
+import re
+import json
+import time
+import subprocess
+import engine
+
+# Decoders the app knows how to label, in the order they are offered. Only those the ffmpeg build lists under -hwaccels are shown.
+HWACCEL_LABELS = {
+    "none": "None (CPU Only)",
+    "cuda": "NVIDIA (CUDA)",
+    "qsv": "Intel (QSV)",
+    "d3d11va": "Windows (D3D11VA)",
+    "dxva2": "Windows (DXVA2)",
+    "vaapi": "Linux (VA-API)",
+    "videotoolbox": "macOS (VideoToolbox)",
+}
+AUTO_LABEL = "Auto (Fastest)"
+# ffmpeg falls back to software decoding when a hardware device cannot be opened, so exit codes alone do not reveal a broken path.
+HWACCEL_FAILURE = re.compile(r"Device creation failed|Hardware device setup failed|hwaccel initiali[sz]ation returned error|Failed setup for format", re.IGNORECASE)
+
+def default_cache_path():
+    return engine.user_data_path("cache", "capabilities.json")
+
+def _ffmpeg_stdout(ffmpeg_path, option):
+    return subprocess.run([ffmpeg_path, '-hide_banner', option], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          text=True, errors="replace", creationflags=engine.CREATION_FLAGS).stdout
+
+def _listed_names(output):
+    # -encoders and -filters print a legend, then one "<flags> <name> ..." line per entry.
+    return sorted({m.group(1) for m in re.finditer(r"^ [A-Z.|]{3,6} +([\w-]+) ", output, re.MULTILINE)})
+
+def probe_capabilities(ffmpeg_path, cache_path=None):
+    cache_path = cache_path or default_cache_path()
+    stat = os.stat(ffmpeg_path)
+    key = f"{os.path.abspath(ffmpeg_path)}|{stat.st_mtime_ns}|{stat.st_size}"
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f: cache = json.load(f)
+    except (OSError, ValueError): cache = {}
+    if key in cache: return cache[key]
+    hwaccels = [line.strip() for line in _ffmpeg_stdout(ffmpeg_path, '-hwaccels').splitlines()[1:] if line.strip()]
+    result = {"hwaccels": hwaccels, "encoders": _listed_names(_ffmpeg_stdout(ffmpeg_path, '-encoders')),
+              "filters": _listed_names(_ffmpeg_stdout(ffmpeg_path, '-filters'))}
+    # Only the entry for the binary in use is kept, so replacing ffmpeg does not leave stale results behind.
+    cache = {k: v for k, v in cache.items() if not k.startswith(os.path.abspath(ffmpeg_path) + "|")}
+    cache[key] = result
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with open(cache_path, 'w', encoding='utf-8') as f: json.dump(cache, f)
+    except OSError as e: print(f"Warning: Could not save ffmpeg capabilities. Error: {e}")
+    return result
+
+def supported_hwaccels(capabilities):
+    return ["none"] + [name for name in HWACCEL_LABELS if name != "none" and name in capabilities["hwaccels"]]
+
+def supported_output_formats(capabilities):
+    return [name for name in engine.file_output_formats() if engine.OUTPUT_FORMATS[name]["codec"] in capabilities["encoders"]]
+
+def time_decode(ffmpeg_path, source_path, hwaccel, seconds=2.0):
+    command = [ffmpeg_path, '-hide_banner', '-nostdin'] + (['-hwaccel', hwaccel] if hwaccel != "none" else []) + ['-t', str(seconds), '-i', source_path, '-an', '-f', 'null', '-']
+    started = time.perf_counter()
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace", creationflags=engine.CREATION_FLAGS)
+    elapsed = time.perf_counter() - started
+    return None if result.returncode != 0 or HWACCEL_FAILURE.search(result.stderr) else elapsed
+
+def benchmark_decoders(ffmpeg_path, source_path, capabilities, seconds=2.0):
+    # Decodes the first seconds of the real source with every available path; paths that fail or fall back are left out.
+    timings = {hwaccel: time_decode(ffmpeg_path, source_path, hwaccel, seconds) for hwaccel in supported_hwaccels(capabilities)}
+    return sorted(((hwaccel, elapsed) for hwaccel, elapsed in timings.items() if elapsed is not None), key=lambda item: item[1])
+
+def resolve_params(ffmpeg_path, source_path, params, capabilities=None, on_output=None):
+    # Turns the requested decoder into one this ffmpeg can use ("auto" picks the fastest on this source)
+    # and tells the planner which GPU filters exist.
+    capabilities = capabilities or probe_capabilities(ffmpeg_path)
+    hwaccel = params.get("hwaccel") or "none"
+    if hwaccel == "auto":
+        ranking = benchmark_decoders(ffmpeg_path, source_path, capabilities)
+        hwaccel = ranking[0][0] if ranking else "none"
+        if on_output: on_output("Decoder benchmark: " + ", ".join(f"{name} {elapsed:.2f}s" for name, elapsed in ranking) + f" -> {hwaccel}\n")
+    elif hwaccel not in supported_hwaccels(capabilities):
+        if on_output: on_output(f"Warning: this ffmpeg build has no '{hwaccel}' decoder; decoding on the CPU.\n")
+        hwaccel = "none"
+    codec = engine.output_format(params)["codec"]
+    if codec not in capabilities["encoders"] and on_output: on_output(f"Warning: this ffmpeg build has no {codec} encoder; the encode will fail.\n")
+    return dict(params, hwaccel=hwaccel, gpu_filters=capabilities["filters"])
@@ -0,0 +1,297 @@
+import argparse
+import json
+import shlex
+import sys
+import os
+import time
+import tempfile
+import engine
+import intermediates
+import capabilities
+import history
+
+def load_preset(args):
+    params = engine.make_params()
+    if args.preset:
+        with open(args.preset, 'r', encoding='utf-8') as f: params.update(json.load(f))
+    overrides = {"color": args.color, "similarity": args.similarity, "blend": args.blend, "denoise": args.denoise,
+                 "resolution": args.resolution, "crf": args.crf, "speed": args.speed, "fps": args.fps,
+                 "audio_bitrate": args.audio_bitrate, "hwaccel": args.hwaccel, "threads": args.threads, "profile": args.profile,
+                 "output_format": args.output_format,
+                 "keyer": args.keyer, "feather": args.feather}
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    if args.despill: params["despill"] = True
+    if args.no_audio: params["no_audio"] = True
+    if getattr(args, "prescale", False): params["prescale"] = True
+    if getattr(args, "target_mb", None): params["target_size_mb"] = args.target_mb
+    return params
+
+def add_preset_arguments(parser):
+    parser.add_argument("--preset", help="JSON file with conversion parameters; flags below override it")
+    parser.add_argument("--color", help="Key color as #rrggbb")
+    parser.add_argument("--similarity", type=float); parser.add_argument("--blend", type=float)
+    parser.add_argument("--denoise", type=float); parser.add_argument("--despill", action="store_true")
+    parser.add_argument("--resolution", help="Output size as WxH")
+    parser.add_argument("--crf", type=int); parser.add_argument("--speed", type=int)
+    parser.add_argument("--fps", type=int, help="Force output framerate (default: keep original)")
+    parser.add_argument("--audio-bitrate"); parser.add_argument("--no-audio", action="store_true")
+    parser.add_argument("--hwaccel", choices=["auto"] + list(capabilities.HWACCEL_LABELS), help="Decoder; auto benchmarks the available ones on the source")
+    parser.add_argument("--threads", type=int, help="Encoder threads per job (default: cores / workers)")
+    parser.add_argument("--profile", choices=list(engine.ENCODER_PROFILES), help="Encoder tuning profile (default: balanced)")
+    parser.add_argument("--keyer", choices=["ffmpeg", "native"], help="ffmpeg's chromakey filter, or the multi-process NumPy keyer (default: ffmpeg)")
+    parser.add_argument("--feather", type=float, help="Native keyer edge feather in pixels (default: 1.0)")
+    parser.add_argument("--format", dest="output_format", choices=engine.file_output_formats(), help="Output format (default: webm)")
+
+def echo(line): print(line, end="")
+
+def cmd_convert(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    sources = engine.collect_sources(args.sources)
+    if not sources: print("Error: No source videos matched.", file=sys.stderr); return 2
+    # Sources in one batch come from the same camera or editor, so the decoder chosen for the first applies to all of them.
+    params = capabilities.resolve_params(ffmpeg_path, sources[0], load_preset(args), on_output=echo)
+    if params["target_size_mb"] and engine.output_format(params)["codec"] != "libvpx-vp9":
+        print("Error: --target-mb needs the WebM format; the other formats have no CRF to adjust.", file=sys.stderr); return 2
+    collisions = engine.colliding_outputs(sources, args.output_dir, engine.output_format(params)["extension"])
+    if collisions:
+        for output, group in collisions.items(): print(f"Error: {', '.join(group)} would all be written to {output}; convert them into separate output folders.", file=sys.stderr)
+        return 2
+    cache = None if args.no_cache else intermediates.IntermediateCache(args.cache_dir, int(args.cache_max_gb * 1024 ** 3))
+    if args.dry_run:
+        if params["target_size_mb"]: print(f"# --target-mb {params['target_size_mb']:g}: the CRF below is replaced by the one picked from sample encodes at run time.")
+        for source in sources:
+            info = engine.probe_video(ffmpeg_path, source); source_params = dict(params, source_width=info["width"], source_height=info["height"])
+            output_path = engine.output_path_for(source, args.output_dir, engine.output_format(params)["extension"])
+            if cache and params["denoise"] > 0:
+                # With the cache on, denoising (and any downscale) runs once into the intermediate and the encode starts from it.
+                intermediate_path = cache.path_for(source, source_params)
+                if not os.path.exists(intermediate_path): print(shlex.join(cache.build_command(ffmpeg_path, source, source_params, intermediate_path)))
+                source, source_params = intermediate_path, cache.keying_params(source_params)
+            for command in engine.build_encode_commands(ffmpeg_path, source, output_path, source_params, passlog="<passlog>"):
+                print(shlex.join(command))
+        return 0
+    workers = args.workers or (1 if args.split else engine.default_worker_count(len(sources)))
+    print(f"Converting {len(sources)} file(s) with {workers} worker(s)...")
+    started = time.perf_counter()
+    run_history = None if args.no_history else history.RunHistory()
+
+    def report(result):
+        status = "OK" if result["return_code"] == 0 else f"FAILED (exit {result['return_code']})"
+        print(f"[{status}] {result['source']} -> {result['output']}")
+        if result["return_code"] != 0: print(result["log_tail"], file=sys.stderr)
+        for line in result["log_tail"].splitlines():
+            if line.startswith("Target size:"): print("  " + line)
+        if run_history:
+            record = run_history.add(history.make_record(ffmpeg_path, result["source"], result["output"], result["params"], result["processes"], result["wall_time"], result["return_code"], args.split))
+            for label, before, after, change in run_history.regressions(record):
+                print(f"  Regression: {label} {before:.4g} -> {after:.4g} ({change * 100:+.0f}%) vs baseline for {record['preset']}")
+
+    results = engine.convert_batch(ffmpeg_path, sources, args.output_dir, params, workers=workers, on_result=report, split=args.split, intermediate_cache=cache)
+    failed = sum(1 for r in results if r["return_code"] != 0)
+    print(f"Done in {time.perf_counter() - started:.1f}s: {len(results) - failed} succeeded, {failed} failed.")
+    if cache and params["denoise"] > 0: print(f"Denoise cache: {cache.summary()}")
+    return 1 if failed else 0
+
+def cmd_compare_split(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    params = capabilities.resolve_params(ffmpeg_path, args.source, load_preset(args), on_output=echo)
+    # A forced output framerate changes the frame count, so only the alpha check applies then.
+    expected_frames = None if params["fps"] else engine.count_frames(ffmpeg_path, args.source)
+    with tempfile.TemporaryDirectory(prefix="stinger_compare_") as work_dir:
+        timings = {}
+        for mode in ("single", "split"):
+            output_path = os.path.join(work_dir, mode + engine.output_format(params)["extension"]); started = time.perf_counter()
+            if mode == "single": return_code = engine.encode(ffmpeg_path, args.source, output_path, params)
+            else: return_code = engine.split_encode(ffmpeg_path, args.source, output_path, params, segment_count=args.segments)
+            if return_code != 0: print(f"Error: {mode} encode failed (exit {return_code}).", file=sys.stderr); return 1
+            timings[mode] = time.perf_counter() - started
+            check = engine.verify_output(ffmpeg_path, output_path, expected_frames, params)
+            print(f"{mode:>6}: {timings[mode]:7.2f}s  frames {check['frames']}/{check['expected_frames'] or '-'}  alpha {'yes' if check['alpha'] else 'NO'}  size {engine.output_size(output_path, params) / 1024:.0f} KiB")
+            if not check["ok"]: print(f"Error: {mode} output failed verification.", file=sys.stderr); return 1
+    print(f"Speedup: {timings['single'] / timings['split']:.2f}x")
+    return 0
+
+def _bench(args, label, variants):
+    # Encodes one clip (the given source, or a generated synthetic stinger) once per (name, param overrides) variant
+    # and prints a row each. Variants whose encoder this ffmpeg build lacks are skipped.
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    supported = capabilities.supported_output_formats(capabilities.probe_capabilities(ffmpeg_path))
+    with tempfile.TemporaryDirectory(prefix="stinger_bench_") as work_dir:
+        source_path = args.source or os.path.join(work_dir, "synthetic.mkv")
+        if not args.source and engine.make_synthetic_clip(ffmpeg_path, source_path, args.size, args.duration) != 0:
+            print("Error: Could not generate the synthetic clip.", file=sys.stderr); return 1
+        frames = engine.count_frames(ffmpeg_path, source_path); info = engine.probe_video(ffmpeg_path, source_path)
+        params = capabilities.resolve_params(ffmpeg_path, source_path, load_preset(args), on_output=echo)
+        print(f"{label:<8} {'time':>8} {'fps':>8} {'size':>12} {'alpha':>6}")
+        for name, overrides in variants:
+            variant_params = dict(params, source_width=info["width"], source_height=info["height"], no_audio=True, target_size_mb=None, **overrides)
+            fmt = engine.output_format(variant_params)
+            if (variant_params.get("output_format") or "webm") not in supported: print(f"{name:<8} SKIPPED (no {fmt['codec']} encoder)"); continue
+            output_path = os.path.join(work_dir, name + fmt["extension"]); started = time.perf_counter()
+            return_code = engine.encode(ffmpeg_path, source_path, output_path, variant_params)
+            elapsed = time.perf_counter() - started
+            if return_code != 0: print(f"{name:<8} FAILED (exit {return_code})"); continue
+            alpha = engine.verify_output(ffmpeg_path, output_path, params=variant_params)["alpha"]
+            print(f"{name:<8} {elapsed:7.2f}s {frames / elapsed:8.1f} {engine.output_size(output_path, variant_params) / 1024:8.0f} KiB {'yes' if alpha else 'NO':>6}")
+    return 0
+
+def cmd_bench_profiles(args):
+    return _bench(args, "profile", [(name, {"profile": name, "output_format": "webm"}) for name in args.profiles or list(engine.ENCODER_PROFILES)])
+
+def cmd_bench_formats(args):
+    return _bench(args, "format", [(name, {"output_format": name}) for name in args.formats or engine.file_output_formats()])
+
+def cmd_bench_keyers(args):
+    return _bench(args, "keyer", [(name, {"keyer": name}) for name in ("ffmpeg", "native")])
+
+def cmd_check_preview(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    import keyer
+    failed = False
+    # The in-process matte must track ffmpeg closely; the only expected mismatches are single pixels on hard edges.
+    for similarity, blend in ((0.1, 0.0), (0.15, 0.1), (0.3, 0.2)):
+        result = keyer.compare_with_ffmpeg(ffmpeg_path, similarity=similarity, blend=blend)
+        ok = result["mean_error"] < args.max_mean_error and result["outlier_ratio"] < args.max_outliers; failed |= not ok
+        print(f"[{'OK' if ok else 'FAILED'}] similarity={similarity} blend={blend}: mean error {result['mean_error']:.4f}, outliers {result['outlier_ratio'] * 100:.2f}%")
+    return 1 if failed else 0
+
+def cmd_auto_key(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    import keyer
+    region = [float(x) for x in args.region.split(",")] if args.region else None
+    if region and (len(region) != 4 or not 0 <= region[0] < region[2] <= 1 or not 0 <= region[1] < region[3] <= 1):
+        print("Error: --region must be x0,y0,x1,y1 fractions of the frame with x0 < x1 and y0 < y1.", file=sys.stderr); return 2
+    started = time.perf_counter()
+    info = engine.probe_video(ffmpeg_path, args.source)
+    sampled = keyer.sample_frames(ffmpeg_path, args.source, info["duration"], (info["width"], info["height"]), args.samples)
+    sampled_at = time.perf_counter()
+    estimate = keyer.estimate_key(sampled, region, args.keyer) if sampled else None
+    finished = time.perf_counter()
+    print(f"Sampled {len(sampled)} frames in {(sampled_at - started) * 1000:.0f} ms, estimated in {(finished - sampled_at) * 1000:.0f} ms")
+    if estimate is None: print("Error: No key color found; pass --region over the background.", file=sys.stderr); return 1
+    print(f"Key covers {estimate['coverage'] * 100:.1f}% of the {'region' if region else 'sampled pixels'}")
+    print(f"--keyer {args.keyer} --color {estimate['color']} --similarity {estimate['similarity']} --blend {estimate['blend']}")
+    return 0
+
+def cmd_history(args):
+    run_history = history.RunHistory(args.history_file)
+    if args.set_baseline:
+        run = run_history.set_baseline(args.set_baseline)
+        if run is None: print(f"Error: No single run matches '{args.set_baseline}'.", file=sys.stderr); return 2
+        print(f"Baseline for {history.group_key(run)} is now {run['id']}.")
+        return 0
+    if args.run:
+        run = run_history.get(args.run)
+        if run is None: print(f"Error: No single run matches '{args.run}'.", file=sys.stderr); return 2
+        if args.json: print(json.dumps(run, indent=2))
+        else: print(history.format_stages(run))
+        return 0
+    runs = [run for run in run_history.runs if not args.preset or args.preset in run["preset"]][-args.last:]
+    if args.json: print(json.dumps(runs, indent=2)); return 0
+    if not runs: print("No runs recorded yet."); return 0
+    print(history.format_report(run_history, runs))
+    return 1 if args.check and any(run_history.regressions(run) for run in runs) else 0
+
+def cmd_capabilities(args):
+    ffmpeg_path = args.ffmpeg or engine.find_ffmpeg_executable()
+    if not ffmpeg_path: print("Error: FFmpeg could not be found.", file=sys.stderr); return 2
+    started = time.perf_counter(); caps = capabilities.probe_capabilities(ffmpeg_path); elapsed = time.perf_counter() - started
+    print(f"{ffmpeg_path} (probed in {elapsed * 1000:.0f} ms)")
+    print(f"  decoders: {', '.join(capabilities.supported_hwaccels(caps))} (ffmpeg lists: {', '.join(caps['hwaccels']) or 'none'})")
+    print(f"  libvpx-vp9: {'yes' if 'libvpx-vp9' in caps['encoders'] else 'NO'}  chromakey: {'yes' if 'chromakey' in caps['filters'] else 'NO'}")
+    print(f"  GPU scalers: {', '.join(f for f in caps['filters'] if f.startswith('scale_')) or 'none'}")
+    if args.source:
+        print(f"Decoding {args.seconds:g}s of {args.source}:")
+        for hwaccel in capabilities.supported_hwaccels(caps):
+            elapsed = capabilities.time_decode(ffmpeg_path, args.source, hwaccel, args.seconds)
+            print(f"  {hwaccel:<12} {'unavailable' if elapsed is None else f'{elapsed:.2f}s'}")
+    return 0
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cli.py", description="Headless Stinger Chroma-Remover.")
+    parser.add_argument("--ffmpeg", help="Path to the ffmpeg executable (default: auto-detect)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="Key and encode one or more source videos")
+    convert.add_argument("sources", nargs="+", help="Source files, directories or glob patterns")
+    convert.add_argument("-o", "--output-dir", required=True)
+    convert.add_argument("-j", "--workers", type=int, help="Concurrent conversions (default: CPU cores)")
+    convert.add_argument("--split", action="store_true", help="Encode each file as parallel segments joined without re-encoding")
+    convert.add_argument("--dry-run", action="store_true", help="Print the planned ffmpeg commands without running them")
+    convert.add_argument("--prescale", action="store_true", help="Also bake an upscaling --resolution into the cached denoised intermediate (downscales always are)")
+    convert.add_argument("--no-cache", action="store_true", help="Always re-run denoise instead of using the intermediate cache")
+    convert.add_argument("--cache-dir", help=f"Intermediate cache directory (default: {intermediates.default_cache_dir()})")
+    convert.add_argument("--cache-max-gb", type=float, default=intermediates.DEFAULT_MAX_BYTES / 1024 ** 3, help="Cache size cap before LRU eviction")
+    convert.add_argument("--no-history", action="store_true", help="Do not record the runs in the run history")
+    convert.add_argument("--target-mb", type=float, help="Pick the CRF from sample encodes so each WebM stays under this size in MB (1 MB = 1024 KiB)")
+    add_preset_arguments(convert)
+    convert.set_defaults(func=cmd_convert)
+
+    compare = sub.add_parser("compare-split", help="Time single-process against split encoding and verify the joined output")
+    compare.add_argument("source")
+    compare.add_argument("--segments", type=int, help="Number of segments (default: CPU cores)")
+    add_preset_arguments(compare)
+    compare.set_defaults(func=cmd_compare_split)
+
+    bench = sub.add_parser("bench-profiles", help="Compare encode fps and output size of each encoder profile on the same clip")
+    bench.add_argument("source", nargs="?", help="Clip to encode (default: a generated synthetic stinger)")
+    bench.add_argument("--profiles", nargs="+", choices=list(engine.ENCODER_PROFILES))
+    bench.add_argument("--size", default="1280x720", help="Synthetic clip size (default: 1280x720)")
+    bench.add_argument("--duration", type=int, default=5, help="Synthetic clip length in seconds (default: 5)")
+    add_preset_arguments(bench)
+    bench.set_defaults(func=cmd_bench_profiles)
+
+    formats = sub.add_parser("bench-formats", help="Compare encode fps and output size of each output format on the same clip")
+    formats.add_argument("source", nargs="?", help="Clip to encode (default: a generated synthetic stinger)")
+    formats.add_argument("--formats", nargs="+", choices=engine.file_output_formats())
+    formats.add_argument("--size", default="1280x720", help="Synthetic clip size (default: 1280x720)")
+    formats.add_argument("--duration", type=int, default=5, help="Synthetic clip length in seconds (default: 5)")
+    add_preset_arguments(formats)
+    formats.set_defaults(func=cmd_bench_formats)
+
+    keyers = sub.add_parser("bench-keyers", help="Compare encode fps of the ffmpeg and native keyers on the same clip")
+    keyers.add_argument("source", nargs="?", help="Clip to encode (default: a generated synthetic stinger)")
+    keyers.add_argument("--size", default="1280x720", help="Synthetic clip size (default: 1280x720)")
+    keyers.add_argument("--duration", type=int, default=5, help="Synthetic clip length in seconds (default: 5)")
+    add_preset_arguments(keyers)
+    keyers.set_defaults(func=cmd_bench_keyers)
+
+    check = sub.add_parser("check-preview", help="Compare the in-process preview matte against ffmpeg's chromakey on a synthetic frame")
+    check.add_argument("--max-mean-error", type=float, default=0.01)
+    check.add_argument("--max-outliers", type=float, default=0.01, help="Allowed fraction of pixels off by more than 0.05")
+    check.set_defaults(func=cmd_check_preview)
+
+    auto = sub.add_parser("auto-key", help="Estimate the key color, similarity and blend from frames sampled across a source")
+    auto.add_argument("source")
+    auto.add_argument("--samples", type=int, default=8, help="Frames to sample across the clip (default: 8)")
+    auto.add_argument("--region", help="Background area as x0,y0,x1,y1 fractions of the frame (default: the dominant saturated color)")
+    auto.add_argument("--keyer", choices=["ffmpeg", "native"], default="ffmpeg", help="Keyer the color is computed for (default: ffmpeg)")
+    auto.set_defaults(func=cmd_auto_key)
+
+    runs = sub.add_parser("history", help="List recorded conversions and flag regressions against the baseline run of each preset")
+    runs.add_argument("--preset", help="Only runs whose preset contains this text")
+    runs.add_argument("--last", type=int, default=20, help="Number of most recent runs to show (default: 20)")
+    runs.add_argument("--run", help="Show the per-stage profile of one run (id or unique prefix)")
+    runs.add_argument("--set-baseline", metavar="RUN", help="Compare later runs of the same preset and source size against this run")
+    runs.add_argument("--check", action="store_true", help="Exit with status 1 if any listed run is a regression")
+    runs.add_argument("--json", action="store_true", help="Print the raw records")
+    runs.add_argument("--history-file", help=f"History file (default: {history.default_history_path()})")
+    runs.set_defaults(func=cmd_history)
+
+    caps = sub.add_parser("capabilities", help="Show what the ffmpeg build supports and optionally time each decoder on a source")
+    caps.add_argument("source", nargs="?", help="Clip to decode with every available decoder")
+    caps.add_argument("--seconds", type=float, default=2.0, help="Seconds of the source to decode per decoder (default: 2)")
+    caps.set_defaults(func=cmd_capabilities)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,447 @@
+import subprocess
+import os
+import sys
+import re
+import glob
+import shutil
+import tempfile
+import time
+import threading
+import collections
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import planner
+
+VIDEO_EXTENSIONS = (".mp4", ".mov", ".mkv", ".avi", ".webm", ".m4v", ".mxf")
+CREATION_FLAGS = subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0
+
+DEFAULT_PARAMS = {
+    "color": "#00ff00", "similarity": 0.15, "blend": 0.1, "denoise": 0.0, "despill": False,
+    "resolution": "", "crf": 20, "speed": 2, "fps": None, "audio_bitrate": "128k", "no_audio": False,
+    "hwaccel": "none", "threads": None, "profile": "balanced", "output_format": "webm",
+    "keyer": "ffmpeg", "feather": 1.0, "target_size_mb": None,
+}
+
+# Output formats with an alpha channel. Only VP9 is rate-controlled by CRF and tuned by ENCODER_PROFILES; the others are
+# intra-only codecs that encode far faster at the cost of much larger files. Sequences write one numbered image per frame.
+# Stream formats are not files at all: "draft" pipes raw RGBA to the in-app preview and "raw_yuv444p" feeds the native keyer.
+OUTPUT_FORMATS = {
+    "webm": {"label": "WebM (VP9)", "extension": ".webm", "codec": "libvpx-vp9", "pix_fmt": "yuva420p", "alpha": True,
+             "codec_options": [], "audio_codec": "libvorbis", "sequence": False, "stream": False},
+    "prores": {"label": "ProRes 4444 (.mov)", "extension": ".mov", "codec": "prores_ks", "pix_fmt": "yuva444p10le", "alpha": True,
+               "codec_options": ['-profile:v', '4444', '-vendor', 'apl0'], "audio_codec": "pcm_s16le", "sequence": False, "stream": False},
+    "qtrle": {"label": "QuickTime Animation (.mov)", "extension": ".mov", "codec": "qtrle", "pix_fmt": "argb", "alpha": True,
+              "codec_options": [], "audio_codec": "pcm_s16le", "sequence": False, "stream": False},
+    "png": {"label": "PNG Sequence", "extension": ".png", "codec": "png", "pix_fmt": "rgba", "alpha": True,
+            "codec_options": [], "audio_codec": None, "sequence": True, "stream": False},
+    "draft": {"label": "Draft preview (raw RGBA)", "extension": "", "codec": "rawvideo", "pix_fmt": "rgba", "alpha": True,
+              "codec_options": ['-f', 'rawvideo'], "audio_codec": None, "sequence": False, "stream": True},
+    "raw_yuv444p": {"label": "Raw YUV 4:4:4 (native keyer input)", "extension": "", "codec": "rawvideo", "pix_fmt": "yuv444p", "alpha": False,
+                    "codec_options": ['-f', 'rawvideo'], "audio_codec": None, "sequence": False, "stream": True},
+}
+
+def file_output_formats():
+    return [name for name, fmt in OUTPUT_FORMATS.items() if not fmt["stream"]]
+
+# Keyframe spacing for every VP9 encode. libvpx's own default depends on the deadline, and target-size projections need to
+# know it.
+VP9_KEYFRAME_INTERVAL = 128
+
+# Named libvpx-vp9 tunings. A speed of None keeps the user's own -speed setting.
+ENCODER_PROFILES = {
+    "draft": {"deadline": "realtime", "speed": 8, "lag_in_frames": 0, "two_pass": False},
+    "balanced": {"deadline": "good", "speed": None, "lag_in_frames": 16, "two_pass": False},
+    "archival": {"deadline": "good", "speed": 1, "lag_in_frames": 25, "two_pass": True},
+}
+
+def user_data_path(kind, name):
+    # kind is "config" for state the user would miss (queue, run history) or "cache" for anything that can be rebuilt.
+    if sys.platform == "win32": base = os.environ.get("APPDATA" if kind == "config" else "LOCALAPPDATA") or os.path.expanduser("~")
+    else: base = os.environ.get("XDG_CONFIG_HOME" if kind == "config" else "XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), "." + kind)
+    return os.path.join(base, "stinger-chroma-remover", name)
+
+def find_ffmpeg_executable():
+    name = "ffmpeg.exe" if sys.platform == "win32" else "ffmpeg"; local_path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), name)
+    if os.path.exists(local_path): return local_path
+    return shutil.which(name)
+
+def make_params(**overrides):
+    params = dict(DEFAULT_PARAMS)
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+def output_format(params):
+    return OUTPUT_FORMATS[params.get("output_format") or "webm"]
+
+def is_two_pass(params):
+    return output_format(params)["codec"] == "libvpx-vp9" and ENCODER_PROFILES[params.get("profile") or "balanced"]["two_pass"]
+
+def output_target(output_path, params):
+    # An image sequence goes into a folder named after the chosen file, as name/name_00001.png and so on.
+    if output_path == '-' or not output_format(params)["sequence"]: return output_path
+    folder, extension = os.path.splitext(output_path)
+    return os.path.join(folder, os.path.basename(folder) + "_%05d" + extension)
+
+def audio_options(params, has_audio=True):
+    audio_codec = output_format(params)["audio_codec"]
+    if params["no_audio"] or not has_audio or not audio_codec: return ['-an']
+    if audio_codec.startswith("pcm_"): return ['-c:a', audio_codec]
+    return ['-c:a', audio_codec, '-b:a', params['audio_bitrate']] if params["audio_bitrate"] else []
+
+def output_width(params):
+    target = planner.parse_resolution(params.get("resolution"), (params.get("source_width"), params.get("source_height")))
+    return target[0] if target else params.get("source_width") or 0
+
+def vp9_tile_columns(width, threads):
+    # libvpx needs tile columns at least 256 px wide, and more tiles than threads buys nothing; row-mt covers the rest.
+    tile_columns = 0
+    while tile_columns < 6 and width >= 256 << (tile_columns + 1) and 1 << (tile_columns + 1) <= threads: tile_columns += 1
+    return tile_columns
+
+def build_ffmpeg_command(ffmpeg_path, source_path, output_path, params, input_options=(), output_options=()):
+    hw_input_options, vf_filters = planner.plan_filter_graph(params, (params.get("source_width"), params.get("source_height")), params.get("gpu_filters"))
+    command = [ffmpeg_path] + list(input_options) + hw_input_options + ['-i', source_path]
+    if vf_filters: command.extend(['-vf', ",".join(vf_filters)])
+    fmt = output_format(params); threads = params.get("threads") or os.cpu_count() or 1
+    encoder_opts = ['-c:v', fmt["codec"], '-pix_fmt', fmt["pix_fmt"]] + fmt["codec_options"]
+    if fmt["codec"] == "libvpx-vp9":
+        profile = ENCODER_PROFILES[params.get("profile") or "balanced"]
+        speed = profile["speed"] if profile["speed"] is not None else int(params['speed'])
+        encoder_opts.extend(['-crf', str(params['crf']), '-b:v', '0', '-g', str(VP9_KEYFRAME_INTERVAL)])
+        encoder_opts.extend(['-speed', f"{speed}", '-deadline', profile["deadline"], '-lag-in-frames', str(profile["lag_in_frames"])])
+        encoder_opts.extend(['-row-mt', '1', '-tile-columns', str(vp9_tile_columns(output_width(params), threads))])
+    command.extend(encoder_opts + ['-threads', str(threads)])
+    if params["fps"]: command.extend(['-r', f"{int(params['fps'])}"])
+    command.extend(audio_options(params))
+    command.extend(list(output_options) + ['-y', output_target(output_path, params)])
+    return command
+
+def build_draft_command(ffmpeg_path, source_path, params, size, start=0.0, duration=None):
+    # The draft goes through the same builder as the real encode, so it gets the same filter chain; only the output is
+    # swapped for raw frames at the preview size, which skips encoding altogether.
+    draft_params = dict(params, output_format="draft", resolution=f"{size[0]}x{size[1]}", no_audio=True, threads=None)
+    input_options = ['-v', 'error', '-nostdin'] + (['-ss', f"{start:.3f}"] if start > 0 else [])
+    return build_ffmpeg_command(ffmpeg_path, source_path, '-', draft_params, input_options, ['-t', f"{duration:.3f}"] if duration else [])
+
+def _pump_lines(stream, on_output):
+    for line in iter(stream.readline, ''):
+        if on_output: on_output(line)
+    stream.close()
+
+def _progress_from_block(block):
+    def number(key):
+        try: return float(block.get(key, '').rstrip('x'))
+        except ValueError: return 0.0
+    return {"frame": int(number("frame")), "fps": number("fps"), "out_time": max(0.0, number("out_time_us") / 1e6),
+            "speed": number("speed"), "total_size": int(number("total_size")), "done": block.get("progress") == "end"}
+
+def parse_progress(stream, on_progress):
+    # -progress writes key=value lines and closes each snapshot with a progress=continue/end line.
+    block = {}
+    for line in iter(stream.readline, ''):
+        key, _, value = line.strip().partition('=')
+        if not key: continue
+        block[key] = value
+        if key == "progress": on_progress(_progress_from_block(block)); block = {}
+    stream.close()
+
+def progress_fraction_eta(progress, duration):
+    if duration <= 0: return None, None
+    passes = progress.get("passes", 1); done_passes = progress.get("pass", 0)
+    fraction = min(1.0, (done_passes * duration + progress["out_time"]) / (duration * passes))
+    remaining = (passes - done_passes) * duration - progress["out_time"]
+    eta = max(0.0, remaining) / progress["speed"] if progress["speed"] > 0 else None
+    return fraction, eta
+
+def _collect_benchmark(process, on_output):
+    # -benchmark ends the log with the process's CPU time and peak memory; they are kept on the process for the run history.
+    process.benchmark = {}; process.started = time.perf_counter(); process.finished = None
+
+    def collect(line):
+        if line.startswith("bench:"): process.benchmark.update({key: float(value) for key, value in re.findall(r"(\w+)=([\d.]+)", line)})
+        if on_output: on_output(line)
+    return collect
+
+def _wait(process):
+    return_code = process.wait(); process.finished = time.perf_counter()
+    return return_code
+
+def run_ffmpeg(command, on_output=None, on_start=None, on_progress=None, stdin=None):
+    # With stdin=subprocess.PIPE the caller feeds the process from on_start; write bytes to process.stdin.buffer.
+    command = [command[0], '-benchmark'] + list(command[1:])
+    if on_progress is None:
+        process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, universal_newlines=True, creationflags=CREATION_FLAGS)
+        output = _collect_benchmark(process, on_output)
+        if on_start: on_start(process)
+        _pump_lines(process.stdout, output)
+        return _wait(process)
+    # Machine-readable progress goes to stdout on its own channel; stderr carries only the log, without stats lines.
+    command = [command[0], '-progress', 'pipe:1', '-nostats'] + list(command[1:])
+    process = subprocess.Popen(command, stdin=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, universal_newlines=True, creationflags=CREATION_FLAGS)
+    output = _collect_benchmark(process, on_output)
+    if on_start: on_start(process)
+    log_thread = threading.Thread(target=_pump_lines, args=(process.stderr, output), daemon=True); log_thread.start()
+    parse_progress(process.stdout, on_progress)
+    log_thread.join()
+    return _wait(process)
+
+def build_encode_commands(ffmpeg_path, source_path, output_path, params, passlog=None, input_options=(), output_options=()):
+    if not is_two_pass(params):
+        return [build_ffmpeg_command(ffmpeg_path, source_path, output_path, params, input_options, output_options)]
+    first_pass = build_ffmpeg_command(ffmpeg_path, source_path, '-', dict(params, no_audio=True), input_options, list(output_options) + ['-pass', '1', '-passlogfile', passlog, '-f', 'null'])
+    second_pass = build_ffmpeg_command(ffmpeg_path, source_path, output_path, params, input_options, list(output_options) + ['-pass', '2', '-passlogfile', passlog])
+    return [first_pass, second_pass]
+
+def run_encode(ffmpeg_path, source_path, output_path, params, on_output=None, on_start=None, on_progress=None, input_options=(), output_options=(), work_dir=None):
+    # Two-pass profiles keep the first-pass stats in a temp dir that lives only as long as the encode.
+    temp_dir = None
+    if is_two_pass(params) and not work_dir: work_dir = temp_dir = tempfile.mkdtemp(prefix="stinger_2pass_")
+    if output_format(params)["sequence"]: os.makedirs(os.path.dirname(output_target(output_path, params)) or ".", exist_ok=True)
+    try:
+        passlog = os.path.join(work_dir, "vp9pass") if work_dir else None
+        if params.get("keyer") == "native":
+            # NumPy and OpenCV are only needed by the native keyer, so the engine keeps loading without them.
+            import native
+            return native.run_native_encode(ffmpeg_path, source_path, output_path, params, passlog, on_output, on_start, on_progress, input_options, output_options)
+        commands = build_encode_commands(ffmpeg_path, source_path, output_path, params, passlog, input_options, output_options)
+        for index, command in enumerate(commands):
+            report = (lambda progress, index=index: on_progress(dict(progress, **{"pass": index, "passes": len(commands)}))) if on_progress else None
+            return_code = run_ffmpeg(command, on_output=on_output, on_start=on_start, on_progress=report)
+            if return_code != 0: return return_code
+        return 0
+    finally:
+        if temp_dir: shutil.rmtree(temp_dir, ignore_errors=True)
+
+def _staged_progress(on_progress, first_pass, total_passes):
+    if not on_progress: return None
+    return lambda progress: on_progress(dict(progress, **{"pass": first_pass + progress.get("pass", 0), "passes": total_passes}))
+
+def _with_source_size(ffmpeg_path, source_path, params):
+    if params.get("source_width") and params.get("source_height"): return params
+    info = probe_video(ffmpeg_path, source_path)
+    return dict(params, source_width=info["width"], source_height=info["height"])
+
+def _tagged(on_start, **tags):
+    # Marks every process started through the callback, so the run history can tell what kind of run it was part of.
+    def start(process):
+        for name, value in tags.items(): setattr(process, name, value)
+        if on_start: on_start(process)
+    return start
+
+def encode(ffmpeg_path, source_path, output_path, params, split=False, on_output=None, on_start=None, on_progress=None, intermediate_cache=None, segment_count=None):
+    if params.get("target_size_mb"):
+        # Sizing encodes a few samples first and comes back here with the CRF it picked.
+        import sizing
+        return sizing.encode_to_target(ffmpeg_path, source_path, output_path, params, split=split, on_output=on_output, on_start=on_start, on_progress=on_progress,
+                                       intermediate_cache=intermediate_cache, segment_count=segment_count)
+    encode_passes = 2 if is_two_pass(params) and not split else 1; first_pass = 0
+    if intermediate_cache and params["denoise"] > 0:
+        # Denoising is by far the slowest stage, so it runs once into a cached lossless file that later encodes start from.
+        params = _with_source_size(ffmpeg_path, source_path, params)
+        intermediate_path = intermediate_cache.lookup(source_path, params)
+        built = []
+        if not intermediate_path:
+            first_pass = 1
+            track_build = _tagged(lambda process, on_start=on_start: (built.append(process), on_start and on_start(process)), denoise_cache="build")
+            return_code, intermediate_path = intermediate_cache.build(ffmpeg_path, source_path, params, on_output=on_output, on_start=track_build, on_progress=_staged_progress(on_progress, 0, 1 + encode_passes))
+            if return_code != 0: return return_code
+        # A job that waited for another job's build of the same intermediate still starts from a cache hit.
+        on_start = _tagged(on_start, denoise_cache="build" if built else "hit")
+        source_path, params = intermediate_path, intermediate_cache.keying_params(params)
+    report = _staged_progress(on_progress, first_pass, first_pass + encode_passes)
+    if split: return split_encode(ffmpeg_path, source_path, output_path, params, segment_count=segment_count, on_output=on_output, on_start=on_start, on_progress=report)
+    return run_encode(ffmpeg_path, source_path, output_path, _with_source_size(ffmpeg_path, source_path, params), on_output=on_output, on_start=on_start, on_progress=report)
+
+def _ffmpeg_stderr(command):
+    return subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace", creationflags=CREATION_FLAGS).stderr
+
+def probe_video(ffmpeg_path, source_path):
+    output = _ffmpeg_stderr([ffmpeg_path, '-hide_banner', '-i', source_path])
+    info = {"width": 0, "height": 0, "fps": 0.0, "duration": 0.0, "has_audio": " Audio: " in output, "alpha_mode": bool(re.search(r"alpha_mode\s*:\s*1", output, re.IGNORECASE))}
+    duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+    if duration: info["duration"] = int(duration.group(1)) * 3600 + int(duration.group(2)) * 60 + float(duration.group(3))
+    video = re.search(r"Video: .*?(\d{2,5})x(\d{2,5})", output)
+    if video: info["width"], info["height"] = int(video.group(1)), int(video.group(2))
+    fps = re.search(r"Video: .*?(\d+(?:\.\d+)?) (?:fps|tbr)", output)
+    if fps: info["fps"] = float(fps.group(1))
+    return info
+
+def count_frames(ffmpeg_path, path):
+    return len(packet_sizes(ffmpeg_path, path))
+
+def packet_sizes(ffmpeg_path, path):
+    # (bytes, keyframe) per video packet. Stream-copying into framecrc writes one line per packet without decoding anything.
+    # VP9 alpha travels as side data, whose size framecrc lists after "S=<count>", so it is counted in too.
+    output = subprocess.run([ffmpeg_path, '-v', 'error', '-nostdin', '-i', path, '-map', '0:v:0', '-c', 'copy', '-f', 'framecrc', '-'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, errors="replace", creationflags=CREATION_FLAGS).stdout
+    packets = []
+    for line in output.splitlines():
+        if not line or line.startswith('#'): continue
+        fields = [field.strip() for field in line.split(',')]
+        side = next((i for i, field in enumerate(fields) if field.startswith('S=')), None)
+        side_bytes = sum(int(size) for size in fields[side + 1:side + 1 + int(fields[side][2:])]) if side is not None else 0
+        flags = next((int(field[2:], 16) for field in fields if field.startswith('F=')), 1)
+        packets.append((int(fields[4]) + side_bytes, bool(flags & 1)))
+    return packets
+
+def probe_keyframes(ffmpeg_path, source_path):
+    output = _ffmpeg_stderr([ffmpeg_path, '-hide_banner', '-skip_frame', 'nokey', '-i', source_path, '-map', '0:v:0', '-vf', 'showinfo', '-f', 'null', '-'])
+    return [float(t) for t in re.findall(r"pts_time:\s*(-?\d+(?:\.\d+)?)", output)]
+
+def plan_segments(keyframe_times, fps, total_frames, count):
+    # Cuts go on the keyframe nearest to each even split so the segment seeks are cheap;
+    # if no keyframe is close enough the cut stays on the even frame, which is still exact.
+    count = max(1, min(count, total_frames // max(1, int(fps)) or 1))
+    keyframes = sorted({int(round(t * fps)) for t in keyframe_times if 0 < t * fps < total_frames})
+    slack = total_frames / count / 4; boundaries = [0]
+    for i in range(1, count):
+        target = total_frames * i / count
+        nearest = min(keyframes, key=lambda k: abs(k - target), default=None)
+        cut = nearest if nearest is not None and abs(nearest - target) <= slack else int(round(target))
+        if cut > boundaries[-1]: boundaries.append(cut)
+    boundaries.append(total_frames)
+    return [(start, end - start) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+def _concat_list_entry(path):
+    return "file '" + os.path.abspath(path).replace("'", "'\\''") + "'\n"
+
+def split_encode(ffmpeg_path, source_path, output_path, params, segment_count=None, on_output=None, on_start=None, on_progress=None):
+    info = probe_video(ffmpeg_path, source_path)
+    total_frames = count_frames(ffmpeg_path, source_path)
+    if not info["fps"] or not total_frames: raise ValueError(f"Could not probe frame rate and frame count of {source_path}.")
+    segment_count = segment_count or os.cpu_count() or 1
+    segments = plan_segments(probe_keyframes(ffmpeg_path, source_path), info["fps"], total_frames, segment_count)
+    segment_params = dict(params, no_audio=True, source_width=info["width"], source_height=info["height"])
+    if not segment_params.get("threads"): segment_params["threads"] = max(1, (os.cpu_count() or 1) // len(segments))
+    work_dir = tempfile.mkdtemp(prefix="stinger_split_", dir=os.path.dirname(os.path.abspath(output_path)))
+    fmt = output_format(params)
+    processes = []; failed = []; segment_progress = {}; progress_lock = threading.Lock(); started = time.perf_counter()
+
+    def track(process):
+        processes.append(process)
+        if on_start: on_start(process)
+
+    def report_progress(index, segment_duration, progress):
+        # Segments run side by side, so the clip is as far along as the sum of their output times.
+        # out_time reads N/A while the encoder is still filling its lookahead, so never let a segment go backwards.
+        passes = progress.get("passes", 1)
+        out_time = (progress.get("pass", 0) * segment_duration + progress["out_time"]) / passes
+        with progress_lock:
+            previous = segment_progress.get(index)
+            progress = dict(progress, out_time=max(out_time, previous["out_time"]) if previous else out_time)
+            segment_progress[index] = progress; running = segment_progress.values()
+            out_time = sum(p["out_time"] for p in running); elapsed = time.perf_counter() - started
+            combined = {"frame": sum(p["frame"] for p in running), "fps": sum(p["fps"] for p in running if not p["done"]),
+                        "out_time": out_time, "speed": out_time / elapsed if elapsed > 0 else 0.0,
+                        "total_size": sum(p["total_size"] for p in running), "done": False}
+        on_progress(combined)
+
+    def encode_segment(index, first_frame, frame_count):
+        part_path = os.path.join(work_dir, f"part{index:04d}{fmt['extension']}")
+        # Seeking half a frame early keeps the first wanted frame and drops the one before it.
+        seek = max(0.0, (first_frame - 0.5) / info["fps"]); first_output_frame = first_frame
+        if params.get("fps"):
+            # With a forced framerate the segment length is counted in output frames instead.
+            scale = params["fps"] / info["fps"]; first_output_frame = round(first_frame * scale)
+            frame_count = round((first_frame + frame_count) * scale) - first_output_frame
+        # Image sequences need no join: every segment writes its own numbered files straight into the output folder.
+        if fmt["sequence"]: part_path, numbering = output_path, ['-start_number', str(first_output_frame + 1)]
+        else: numbering = []
+        report = (lambda progress: report_progress(index, frame_count / (params.get("fps") or info["fps"]), progress)) if on_progress else None
+        segment_dir = os.path.join(work_dir, f"pass{index:04d}"); os.makedirs(segment_dir, exist_ok=True)
+        return_code = run_encode(ffmpeg_path, source_path, part_path, segment_params, on_output=on_output, on_start=track, on_progress=report,
+                                 input_options=['-ss', f"{seek:.6f}"], output_options=['-frames:v', str(frame_count)] + numbering, work_dir=segment_dir)
+        if return_code != 0:
+            failed.append(return_code)
+            for process in processes:
+                if process.poll() is None: process.terminate()
+        return part_path
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            parts = list(pool.map(lambda item: encode_segment(item[0], *item[1]), enumerate(segments)))
+        if failed or fmt["sequence"]: return failed[0] if failed else 0
+        list_path = os.path.join(work_dir, "parts.txt")
+        with open(list_path, 'w', encoding='utf-8') as f: f.writelines(_concat_list_entry(part) for part in parts)
+        command = [ffmpeg_path, '-f', 'concat', '-safe', '0', '-i', list_path, '-i', source_path, '-map', '0:v', '-c:v', 'copy']
+        # The concat demuxer keeps VP9's alpha side data but drops the stream tag that tells players to look for it.
+        if fmt["codec"] == "libvpx-vp9": command.extend(['-metadata:s:v:0', 'alpha_mode=1'])
+        audio = audio_options(params, info["has_audio"])
+        command.extend((['-map', '1:a:0'] if audio != ['-an'] else []) + audio + ['-y', output_path])
+        return run_ffmpeg(command, on_output=on_output, on_start=track)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def output_size(output_path, params):
+    if not output_format(params)["sequence"]: return os.path.getsize(output_path)
+    folder = os.path.dirname(output_target(output_path, params))
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder))
+
+def has_alpha_plane(ffmpeg_path, path, vp9=True):
+    # The native vp9 decoder ignores the alpha side data, so decode with libvpx to see whether it is there.
+    output = _ffmpeg_stderr([ffmpeg_path, '-hide_banner'] + (['-c:v', 'libvpx-vp9'] if vp9 else []) + ['-i', path, '-map', '0:v:0', '-vf', 'showinfo', '-frames:v', '1', '-f', 'null', '-'])
+    return bool(re.search(r"fmt:(yuva|rgba|argb|bgra|abgr|gbrap|ya)", output))
+
+def verify_output(ffmpeg_path, output_path, expected_frames=None, params=None):
+    # For image sequences pass the params too, so the numbered file pattern is checked rather than the chosen name.
+    vp9 = output_format(params or {})["codec"] == "libvpx-vp9"; output_path = output_target(output_path, params or {})
+    frames = count_frames(ffmpeg_path, output_path)
+    alpha = (not vp9 or probe_video(ffmpeg_path, output_path)["alpha_mode"]) and has_alpha_plane(ffmpeg_path, output_path, vp9)
+    return {"frames": frames, "expected_frames": expected_frames, "alpha": alpha, "ok": alpha and expected_frames in (None, frames)}
+
+def make_synthetic_clip(ffmpeg_path, path, size="1280x720", duration=5, fps=30):
+    # A moving test pattern on a flat green screen, stored losslessly so every benchmark starts from identical frames.
+    width, height = (int(v) for v in size.split("x"))
+    graph = (f"color=c=0x00b140:s={size}:r={fps}:d={duration}[bg];testsrc2=s={width // 2}x{height // 2}:r={fps}:d={duration}[fg];"
+             f"[bg][fg]overlay=x='(W-w)*t/{duration}':y=(H-h)/2:shortest=1")
+    return subprocess.run([ffmpeg_path, '-v', 'error', '-f', 'lavfi', '-i', graph, '-c:v', 'ffv1', '-pix_fmt', 'yuv420p', '-y', path], creationflags=CREATION_FLAGS).returncode
+
+def collect_sources(patterns):
+    sources = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            matches = [os.path.join(pattern, f) for f in sorted(os.listdir(pattern)) if f.lower().endswith(VIDEO_EXTENSIONS)]
+        else:
+            matches = sorted(glob.glob(pattern))
+        sources.extend(m for m in matches if os.path.isfile(m) and m not in sources)
+    return sources
+
+def default_worker_count(job_count):
+    return max(1, min(os.cpu_count() or 1, job_count))
+
+def output_path_for(source_path, output_dir, extension=".webm"):
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(source_path))[0] + extension)
+
+def colliding_outputs(sources, output_dir, extension=".webm"):
+    # Output names come from the source's base name only, so a/intro.mp4 and b/intro.mov would overwrite each other.
+    outputs = collections.defaultdict(list)
+    for source_path in sources: outputs[os.path.normcase(os.path.abspath(output_path_for(source_path, output_dir, extension)))].append(source_path)
+    return {output: group for output, group in outputs.items() if len(group) > 1}
+
+def convert_batch(ffmpeg_path, sources, output_dir, params, workers=None, on_result=None, split=False, intermediate_cache=None):
+    # Each job is an ffmpeg child process, so a thread per slot is enough to keep the pool busy;
+    # the encoder threads are split evenly so concurrent jobs do not oversubscribe the cores.
+    collisions = colliding_outputs(sources, output_dir, output_format(params)["extension"])
+    if collisions: raise ValueError("Several sources would write the same output: " + "; ".join(f"{', '.join(group)} -> {output}" for output, group in collisions.items()))
+    workers = workers or default_worker_count(len(sources))
+    job_params = dict(params)
+    if not job_params.get("threads"): job_params["threads"] = max(1, (os.cpu_count() or 1) // workers)
+    os.makedirs(output_dir, exist_ok=True)
+
+    def convert_one(source_path):
+        output_path = output_path_for(source_path, output_dir, output_format(params)["extension"])
+        log_tail = collections.deque(maxlen=20); processes = []; started = time.perf_counter()
+        try:
+            return_code = encode(ffmpeg_path, source_path, output_path, params if split else job_params, split=split, segment_count=max(1, (os.cpu_count() or 1) // workers),
+                                 on_output=log_tail.append, on_start=processes.append, intermediate_cache=intermediate_cache)
+        except (OSError, ValueError, RuntimeError) as e:
+            # One file that cannot be probed or sized fails on its own instead of taking the batch down.
+            log_tail.append(f"Error: {e}\n"); return_code = 1
+        return {"source": source_path, "output": output_path, "return_code": return_code, "log_tail": "".join(log_tail),
+                "params": params if split else job_params, "processes": processes, "wall_time": time.perf_counter() - started}
+
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(convert_one, source) for source in sources]
+        for future in as_completed(futures):
+            result = future.result(); results.append(result)
+            if on_result: on_result(result)
+    return results
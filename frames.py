@@ -0,0 +1,154 @@
+import threading
+import time
+import collections
+import queue
+import subprocess
+import cv2
+import numpy as np
+import engine
+import keyer
+
+class FrameCache:
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.frames = collections.OrderedDict()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, index, record=True):
+        with self.lock:
+            frame = self.frames.get(index)
+            if frame is None:
+                if record: self.misses += 1
+                return None
+            self.frames.move_to_end(index)
+            if record: self.hits += 1
+            return frame
+
+    def __contains__(self, index):
+        with self.lock: return index in self.frames
+
+    def put(self, index, frame):
+        with self.lock:
+            if index in self.frames: self.bytes_used -= self.frames.pop(index).nbytes
+            self.frames[index] = frame; self.bytes_used += frame.nbytes
+            while self.bytes_used > self.max_bytes and len(self.frames) > 1:
+                self.bytes_used -= self.frames.popitem(last=False)[1].nbytes
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+class FrameServer:
+    # Owns the only VideoCapture for a clip. A worker thread decodes the frame under the cursor first and then
+    # prefetches its neighbours, so the Tk thread only ever reads from the cache.
+    def __init__(self, path, size, max_bytes=256 * 1024 * 1024, prefetch_ahead=12, prefetch_behind=4):
+        self.path = path
+        self.size = size
+        self.cache = FrameCache(max_bytes)
+        self.prefetch_ahead = prefetch_ahead
+        self.prefetch_behind = prefetch_behind
+        self.cursor = 0
+        self.decode_count = 0
+        self.decode_seconds = 0.0
+        self.unreadable = set()
+        self.running = True
+        self.wakeup = threading.Condition()
+        capture = cv2.VideoCapture(path)
+        self.frame_count = max(1, int(capture.get(cv2.CAP_PROP_FRAME_COUNT)))
+        self.fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        capture.release()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def get(self, index, record=True):
+        return self.cache.get(index, record)
+
+    def seek(self, index):
+        with self.wakeup:
+            self.cursor = max(0, min(index, self.frame_count - 1)); self.wakeup.notify()
+
+    def stop(self):
+        with self.wakeup:
+            self.running = False; self.wakeup.notify()
+
+    def average_decode_ms(self):
+        return self.decode_seconds / self.decode_count * 1000 if self.decode_count else 0.0
+
+    def _wanted_frames(self, cursor):
+        ahead = range(cursor, min(cursor + self.prefetch_ahead + 1, self.frame_count))
+        behind = range(max(cursor - self.prefetch_behind, 0), cursor)
+        return [i for i in list(ahead) + list(behind) if i not in self.cache and i not in self.unreadable]
+
+    def _run(self):
+        capture = cv2.VideoCapture(self.path); position = 0
+        try:
+            while True:
+                with self.wakeup:
+                    while self.running and not self._wanted_frames(self.cursor): self.wakeup.wait()
+                    if not self.running: return
+                    cursor = self.cursor
+                index = self._wanted_frames(cursor)[0]
+                started = time.perf_counter()
+                # Reading on is far cheaper than seeking, so only seek when the wanted frame is not the next one.
+                if index != position: capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+                ret, frame = capture.read()
+                if not ret:
+                    # Container frame counts are estimates; remember the hole so the worker does not retry it forever.
+                    self.unreadable.add(index); position = -1; continue
+                position = index + 1
+                frame = cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB), self.size, interpolation=cv2.INTER_AREA)
+                self.decode_seconds += time.perf_counter() - started; self.decode_count += 1
+                self.cache.put(index, frame)
+        finally:
+            capture.release()
+
+class DraftRenderer:
+    # Plays a draft render straight from ffmpeg's stdout. A worker thread cuts the raw RGBA stream into frames and
+    # composites them over a checkerboard; the bounded queue stalls ffmpeg when playback falls behind.
+    def __init__(self, command, size, max_frames=60):
+        self.size = size
+        self.background = keyer.checkerboard(*size)
+        self.frames = queue.Queue(maxsize=max_frames)
+        self.frame_count = 0
+        self.error = ""
+        self.done = False
+        self.stopped = False
+        self.started = time.perf_counter()
+        self.render_seconds = 0.0
+        self.process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=engine.CREATION_FLAGS)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def next_frame(self):
+        try: return self.frames.get_nowait()
+        except queue.Empty: return None
+
+    def finished(self):
+        return self.done and self.frames.empty()
+
+    def render_fps(self):
+        return self.frame_count / self.render_seconds if self.render_seconds else 0.0
+
+    def stop(self):
+        self.stopped = True
+        if self.process.poll() is None: self.process.terminate()
+
+    def _run(self):
+        width, height = self.size; frame_bytes = width * height * 4
+        try:
+            while not self.stopped:
+                data = self.process.stdout.read(frame_bytes)
+                if len(data) < frame_bytes: break
+                rgba = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 4)
+                alpha = rgba[..., 3:4].astype(np.float32) * (1.0 / 255.0)
+                frame = (rgba[..., :3] * alpha + self.background * (1.0 - alpha)).astype(np.uint8)
+                self.frame_count += 1; self.render_seconds = time.perf_counter() - self.started
+                while not self.stopped:
+                    try: self.frames.put(frame, timeout=0.1); break
+                    except queue.Full: continue
+        finally:
+            if not self.stopped and self.process.wait() != 0: self.error = self.process.stderr.read().decode("utf-8", "replace").strip()
+            self.stop(); self.process.stdout.close(); self.process.stderr.close(); self.done = True
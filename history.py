@@ -0,0 +1,154 @@
+import os
+import json
+import shlex
+import time
+import uuid
+import platform
+import threading
+import subprocess
+import engine
+
+HISTORY_LIMIT = 1000
+# (record key, column label, True when a higher value is better, relative change that counts as a regression)
+METRICS = (("fps", "fps", True, 0.10), ("cpu_per_frame", "cpu/frame", False, 0.10), ("maxrss_kib", "memory", False, 0.25), ("bitrate_kbps", "bitrate", False, 0.10))
+_ffmpeg_versions = {}
+
+def default_history_path():
+    return engine.user_data_path("config", "history.json")
+
+def ffmpeg_version(ffmpeg_path):
+    if ffmpeg_path not in _ffmpeg_versions:
+        output = subprocess.run([ffmpeg_path, '-hide_banner', '-version'], stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                text=True, errors="replace", creationflags=engine.CREATION_FLAGS).stdout
+        _ffmpeg_versions[ffmpeg_path] = output.splitlines()[0].split(" Copyright")[0] if output else ""
+    return _ffmpeg_versions[ffmpeg_path]
+
+def preset_key(params, split=False, denoise_cache="off"):
+    # Runs are only compared with runs of the same settings; paths, thread counts and the chosen decoder do not count.
+    # A run that reused a cached denoise intermediate skips the slowest stage, so hits and builds are kept apart.
+    resolution = params.get("resolution") or "source"; quality = f"target{params['target_size_mb']:g}MB" if params.get("target_size_mb") else f"crf{params['crf']}"
+    key = f"{params.get('output_format') or 'webm'}/{params.get('profile') or 'balanced'}/{params.get('keyer') or 'ffmpeg'}/{quality}/speed{params['speed']}/denoise{params['denoise']:g}/{resolution}"
+    return key + ("/split" if split else "") + (f"/intermediate-{denoise_cache}" if denoise_cache != "off" else "")
+
+def denoise_cache_state(processes):
+    # "build" when the run denoised into the intermediate cache, "hit" when it started from a cached one, else "off".
+    states = {getattr(process, "denoise_cache", None) for process in processes}
+    return "build" if "build" in states else "hit" if "hit" in states else "off"
+
+def stage_stats(process):
+    # One entry per ffmpeg process: denoise intermediate, encode passes, split segments and the final join.
+    benchmark = getattr(process, "benchmark", {}); started, finished = getattr(process, "started", None), getattr(process, "finished", None)
+    return {"command": [str(arg) for arg in process.args], "wall_time": finished - started if started and finished else None,
+            "utime": benchmark.get("utime"), "stime": benchmark.get("stime"), "maxrss_kib": benchmark.get("maxrss"), "return_code": process.returncode}
+
+def make_record(ffmpeg_path, source_path, output_path, params, processes, wall_time, return_code, split=False):
+    info = engine.probe_video(ffmpeg_path, source_path)
+    rate = params.get("fps") or info["fps"]; frames = int(round(info["duration"] * rate)) if rate else 0
+    try: size = engine.output_size(output_path, params) if return_code == 0 else 0
+    except OSError: size = 0
+    stages = [stage_stats(process) for process in processes]; denoise_cache = denoise_cache_state(processes)
+    cpu_time = sum((stage["utime"] or 0) + (stage["stime"] or 0) for stage in stages)
+    return {"id": uuid.uuid4().hex[:12], "time": time.time(), "preset": preset_key(params, split, denoise_cache), "denoise_cache": denoise_cache, "return_code": return_code,
+            "source": source_path, "output": output_path, "source_resolution": f"{info['width']}x{info['height']}", "source_duration": info["duration"],
+            "frames": frames, "wall_time": wall_time, "fps": frames / wall_time if wall_time > 0 else 0.0,
+            "output_size": size, "bitrate_kbps": size * 8 / info["duration"] / 1000 if info["duration"] > 0 else 0.0,
+            "cpu_time": cpu_time, "cpu_per_frame": cpu_time / frames if frames else 0.0,
+            "maxrss_kib": max((stage["maxrss_kib"] or 0 for stage in stages), default=0),
+            "ffmpeg": {"path": ffmpeg_path, "version": ffmpeg_version(ffmpeg_path)},
+            "machine": {"host": platform.node(), "platform": platform.platform(), "cpus": os.cpu_count()},
+            "params": {key: value for key, value in params.items() if key != "gpu_filters"}, "stages": stages}
+
+def group_key(run):
+    # fps and bitrate depend on the source as much as on the settings, so baselines are per preset and source size.
+    return f"{run['preset']} @ {run['source_resolution']}"
+
+class RunHistory:
+    # A JSON file of finished conversions, oldest first, plus the baseline run chosen for each preset. Pinned baselines
+    # are never dropped when the history is trimmed to its limit.
+    def __init__(self, path=None, limit=HISTORY_LIMIT):
+        self.path = path or default_history_path()
+        self.limit = limit
+        self.runs = []
+        self.baselines = {}
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: saved = json.load(f)
+        except (OSError, ValueError): return
+        self.runs = saved.get("runs", []); self.baselines = saved.get("baselines", {})
+
+    def save(self):
+        with self.lock: data = {"runs": list(self.runs), "baselines": dict(self.baselines)}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=1)
+        os.replace(temp_path, self.path)
+
+    def add(self, record):
+        with self.lock:
+            self.runs.append(record)
+            pinned = set(self.baselines.values())
+            while len(self.runs) > self.limit:
+                oldest = next((run for run in self.runs if run["id"] not in pinned), None)
+                if oldest is None: break
+                self.runs.remove(oldest)
+        try: self.save()
+        except OSError as e: print(f"Warning: Could not save run history. Error: {e}")
+        return record
+
+    def get(self, run_id):
+        # Ids can be shortened on the command line as long as the prefix is unique.
+        matches = [run for run in self.runs if run["id"].startswith(run_id)]
+        return matches[0] if len(matches) == 1 else None
+
+    def set_baseline(self, run_id):
+        run = self.get(run_id)
+        if run is None: return None
+        with self.lock: self.baselines[group_key(run)] = run["id"]
+        self.save()
+        return run
+
+    def baseline_for(self, run):
+        # The pinned run for the preset, or else the first successful run recorded with it.
+        with self.lock:
+            pinned = self.baselines.get(group_key(run))
+            baseline = next((r for r in self.runs if r["id"] == pinned), None) if pinned else None
+            if baseline is None: baseline = next((r for r in self.runs if r["return_code"] == 0 and group_key(r) == group_key(run)), None)
+        return baseline if baseline is not None and baseline["id"] != run["id"] else None
+
+    def regressions(self, run, baseline=None):
+        baseline = baseline or self.baseline_for(run)
+        if baseline is None or run["return_code"] != 0: return []
+        found = []
+        for key, label, higher_is_better, threshold in METRICS:
+            before, after = baseline.get(key) or 0, run.get(key) or 0
+            if before <= 0 or after <= 0: continue
+            change = after / before - 1
+            if (-change if higher_is_better else change) > threshold: found.append((label, before, after, change))
+        return found
+
+def _megabytes(value): return f"{value / 1024 ** 2:.1f} MB"
+
+def format_report(history, runs):
+    lines = [f"{'run':<12} {'date':<16} {'preset':<72} {'source':>9} {'wall':>8} {'fps':>7} {'size':>9} {'kbps':>7} {'cpu':>7} {'mem':>8}  vs baseline"]
+    for run in runs:
+        baseline = history.baseline_for(run)
+        if run["return_code"] != 0: verdict = f"FAILED (exit {run['return_code']})"
+        elif baseline is None: verdict = "baseline"
+        else:
+            found = history.regressions(run, baseline)
+            verdict = (f"REGRESSION vs {baseline['id'][:8]}: " + ", ".join(f"{label} {change * 100:+.0f}%" for label, _, _, change in found)) if found else f"ok vs {baseline['id'][:8]}"
+        lines.append(f"{run['id'][:12]:<12} {time.strftime('%Y-%m-%d %H:%M', time.localtime(run['time'])):<16} {run['preset'][:72]:<72} {run['source_resolution']:>9} "
+                     f"{run['wall_time']:7.1f}s {run['fps']:7.1f} {_megabytes(run['output_size']):>9} {run['bitrate_kbps']:7.0f} {run['cpu_time']:6.1f}s {run['maxrss_kib'] / 1024:6.0f}MB  {verdict}")
+    return "\n".join(lines)
+
+def format_stages(run):
+    lines = [f"Run {run['id']} ({run['preset']}, {run['ffmpeg']['version'] or run['ffmpeg']['path']}, {run['machine']['cpus']} CPUs on {run['machine']['host']})",
+             f"{run['source']} -> {run['output']}", f"{'stage':<6} {'wall':>8} {'user':>8} {'system':>8} {'memory':>8}  command"]
+    for index, stage in enumerate(run["stages"]):
+        seconds = lambda value: f"{value:7.2f}s" if value is not None else f"{'-':>8}"
+        memory = f"{stage['maxrss_kib'] / 1024:6.0f}MB" if stage["maxrss_kib"] else f"{'-':>8}"
+        lines.append(f"{index + 1:<6} {seconds(stage['wall_time'])} {seconds(stage['utime'])} {seconds(stage['stime'])} {memory}  {shlex.join(stage['command'])}")
+    return "\n".join(lines)
@@ -1,15 +1,38 @@
+import startup
+startup_timer = startup.StartupTimer()
+import sys
+import time
 import tkinter as tk
 from tkinter import filedialog, messagebox
+startup_timer.mark("import tkinter")
 import customtkinter as ctk
-import subprocess
+startup_timer.mark("import customtkinter")
 import os
-import sys
-import shutil
-import cv2
-from PIL import Image, ImageTk
-import threading
 import queue
 import json
+import threading
+import engine
+import intermediates
+import jobs
+import capabilities
+import history
+startup_timer.mark("import engine modules")
+
+LOG_MAX_LINES = 2000
+LANGUAGE_INDEX_FILE = ".index.json"
+KEYER_LABELS = {"ffmpeg": "FFmpeg (chromakey)", "native": "Native (NumPy, multi-core)"}
+
+# cv2, numpy and the preview modules built on them are the slowest imports by far; they are loaded when the first video is opened.
+cv2 = Image = ImageTk = keyer = frames = None
+
+def load_video_modules():
+    global cv2, Image, ImageTk, keyer, frames
+    if cv2 is not None: return False
+    import cv2
+    from PIL import Image, ImageTk
+    import keyer
+    import frames
+    return True
 
 class LanguageManager:
     def __init__(self, languages_dir='languages'):
@@ -22,14 +45,28 @@ class LanguageManager:
         self.load_language(list(self.available_languages.keys())[0])
 
     def scan_for_languages(self):
+        # Language names come from a small index; a language file is only parsed again when its mtime or size changes.
         if not os.path.exists(self.languages_dir): os.makedirs(self.languages_dir)
-        for filename in os.listdir(self.languages_dir):
-            if filename.endswith(".json"):
+        index_path = os.path.join(self.languages_dir, LANGUAGE_INDEX_FILE)
+        try:
+            with open(index_path, 'r', encoding='utf-8') as f: index = json.load(f)
+        except (OSError, ValueError): index = {}
+        fresh_index = {}
+        for filename in sorted(os.listdir(self.languages_dir)):
+            if not filename.endswith(".json") or filename == LANGUAGE_INDEX_FILE: continue
+            stat = os.stat(os.path.join(self.languages_dir, filename))
+            entry = index.get(filename)
+            if not entry or entry.get("mtime") != stat.st_mtime_ns or entry.get("size") != stat.st_size:
                 try:
                     with open(os.path.join(self.languages_dir, filename), 'r', encoding='utf-8') as f:
-                        data = json.load(f)
-                        self.available_languages[data.get("language_name", filename)] = filename
-                except Exception as e: print(f"Warning: Could not parse {filename}. Error: {e}")
+                        entry = {"mtime": stat.st_mtime_ns, "size": stat.st_size, "language_name": json.load(f).get("language_name", filename)}
+                except Exception as e: print(f"Warning: Could not parse {filename}. Error: {e}"); continue
+            fresh_index[filename] = entry
+            self.available_languages[entry["language_name"]] = filename
+        if fresh_index != index:
+            try:
+                with open(index_path, 'w', encoding='utf-8') as f: json.dump(fresh_index, f, indent=2)
+            except OSError as e: print(f"Warning: Could not write language index. Error: {e}")
 
     def load_language(self, language_name):
         filename = self.available_languages.get(language_name)
@@ -46,22 +83,43 @@ class LanguageManager:
 class StingerChromaRemover(ctk.CTk):
     def __init__(self, lang_manager):
         super().__init__()
+        startup_timer.mark("create root window")
         self.lang_manager = lang_manager
         
         self.source_video_path = ""
         self.chroma_key_color = ""
         self.preview_image_original = None
         self.preview_image_tk = None
+        self.preview_keyer = None
+        self.preview_center = (300, 300)
+        self.preview_source_size = (0, 0)
+        self.frame_server = None
+        self.scrub_index = 0
+        self.scrub_poll_pending = False
+        self.draft_renderer = None
+        self.drag_start = None
+        self.auto_key_running = False
+        self.draft_fps = 30.0
         self.ffmpeg_executable_path = self._find_ffmpeg_executable()
+        self.ffmpeg_capabilities = capabilities.probe_capabilities(self.ffmpeg_executable_path) if self.ffmpeg_executable_path else {"hwaccels": [], "encoders": [], "filters": []}
+        # Finding ffmpeg and its capabilities (three ffmpeg runs when the cache is cold) and loading the saved state block the
+        # first draw, so each gets its own phase in the startup report.
+        startup_timer.mark("probe ffmpeg")
         self.conversion_queue = queue.Queue()
-        self.is_converting = False
-        self.ffmpeg_process = None
-        self.interactive_widgets = []
+        self.intermediate_cache = intermediates.IntermediateCache()
+        self.run_history = history.RunHistory()
+        startup_timer.mark("load run history")
+        self.job_queue = jobs.JobQueue(self.ffmpeg_executable_path, intermediate_cache=self.intermediate_cache, on_output=self.conversion_queue.put, run_history=self.run_history)
+        startup_timer.mark("load job queue")
+        self.job_rows = {}
+        self.job_states = {}
+        self.job_queue_revision = -1
 
         self._setup_window()
         self._create_widgets()
-        self._collect_interactive_widgets()
         self.update_ui_text()
+        if self.ffmpeg_executable_path: self.job_queue.schedule()
+        self.after(100, self.update_log_from_queue)
 
     def _setup_window(self):
         self.title("Stinger Chroma Remover")
@@ -83,13 +141,15 @@ class StingerChromaRemover(ctk.CTk):
         self.step1_label.configure(text=self.lang_manager.get_string("step1_label"))
         self.select_video_button.configure(text=self.lang_manager.get_string("select_video_button"))
         
-        if not self.is_converting:
-            self.convert_button.configure(text=self.lang_manager.get_string("step3_button"))
+        self.convert_button.configure(text=self.lang_manager.get_string("step3_button"))
+        self.draft_button.configure(text=self.lang_manager.get_string("draft_stop_button" if self.draft_renderer else "draft_button"))
+        whole_clip = self.lang_manager.get_string("draft_whole_clip")
+        self.draft_length_select.configure(values=["2 s", "5 s", "10 s", whole_clip])
+        if self.draft_length_select.get() not in ("2 s", "5 s", "10 s"): self.draft_length_select.set(whole_clip)
             
-        if not self.source_video_path: self.file_label.configure(text=self.lang_manager.get_string("no_file_selected"))
-        
-        if not self.is_converting and not self.source_video_path:
-             self.status_label.configure(text=self.lang_manager.get_string("welcome_message"))
+        if not self.source_video_path:
+            self.file_label.configure(text=self.lang_manager.get_string("no_file_selected"))
+            self.status_label.configure(text=self.lang_manager.get_string("welcome_message"))
 
         self.update_ffmpeg_status_text()
         
@@ -100,15 +160,30 @@ class StingerChromaRemover(ctk.CTk):
         self.denoise_label.configure(text=self.lang_manager.get_string("quality_tab", "denoise_label"))
         self.despill_label.configure(text=self.lang_manager.get_string("quality_tab", "despill_label"))
         self.despill_checkbox.configure(text=self.lang_manager.get_string("quality_tab", "despill_checkbox"))
+        self.keyed_preview_checkbox.configure(text=self.lang_manager.get_string("quality_tab", "keyed_preview_checkbox"))
+        self.keyer_label.configure(text=self.lang_manager.get_string("quality_tab", "keyer_label"))
+        self.auto_key_button.configure(text=self.lang_manager.get_string("quality_tab", "auto_key_button"))
         
         self.hw_accel_label.configure(text=self.lang_manager.get_string("advanced_tab", "hw_accel_label"))
         self.resolution_label.configure(text=self.lang_manager.get_string("advanced_tab", "resolution_label"))
         self.crf_label_widget.configure(text=self.lang_manager.get_string("advanced_tab", "crf_label"))
+        self.target_size_label.configure(text=self.lang_manager.get_string("advanced_tab", "target_size_label"))
         self.speed_label_widget.configure(text=self.lang_manager.get_string("advanced_tab", "speed_label"))
+        self.encoder_profile_label.configure(text=self.lang_manager.get_string("advanced_tab", "encoder_profile_label"))
+        self.output_format_label.configure(text=self.lang_manager.get_string("advanced_tab", "output_format_label"))
         self.fps_label_widget.configure(text=self.lang_manager.get_string("advanced_tab", "fps_label"))
         self.keep_fps_checkbox.configure(text=self.lang_manager.get_string("advanced_tab", "keep_fps_checkbox"))
         self.audio_bitrate_label.configure(text=self.lang_manager.get_string("advanced_tab", "audio_bitrate_label"))
         self.no_audio_checkbox.configure(text=self.lang_manager.get_string("advanced_tab", "no_audio_checkbox"))
+        self.split_encode_checkbox.configure(text=self.lang_manager.get_string("advanced_tab", "split_encode_checkbox"))
+        self.update_denoise_cache_text()
+
+        self.concurrency_label.configure(text=self.lang_manager.get_string("queue_tab", "concurrency_label"))
+        self.clear_jobs_button.configure(text=self.lang_manager.get_string("queue_tab", "clear_button"))
+        self.refresh_history_button.configure(text=self.lang_manager.get_string("history_tab", "refresh_button"))
+        self.history_baseline_button.configure(text=self.lang_manager.get_string("history_tab", "baseline_button"))
+        self._refresh_history()
+        self.job_queue_revision = -1
     
     def _create_header_frame(self):
         header_frame = ctk.CTkFrame(self, fg_color="transparent")
@@ -134,42 +209,57 @@ class StingerChromaRemover(ctk.CTk):
         self.preview_frame.grid(row=1, column=0, padx=20, pady=20, sticky="nsew")
         self.preview_frame.grid_rowconfigure(0, weight=1); self.preview_frame.grid_columnconfigure(0, weight=1)
         self.preview_canvas = tk.Canvas(self.preview_frame, cursor="crosshair", background="#242424", highlightthickness=0)
-        self.preview_canvas.grid(row=0, column=0, sticky="nsew"); self.preview_canvas.bind("<Button-1>", self.on_preview_clicked)
+        self.preview_canvas.grid(row=0, column=0, sticky="nsew"); self.preview_canvas.bind("<ButtonPress-1>", self.on_preview_pressed)
+        self.preview_canvas.bind("<B1-Motion>", self.on_preview_dragged); self.preview_canvas.bind("<ButtonRelease-1>", self.on_preview_released)
+        scrub_frame = ctk.CTkFrame(self.preview_frame, fg_color="transparent"); scrub_frame.grid(row=1, column=0, sticky="ew", padx=10, pady=(0, 10)); scrub_frame.grid_columnconfigure(0, weight=1)
+        self.frame_slider = ctk.CTkSlider(scrub_frame, from_=0, to=1, command=self.on_frame_scrub, state="disabled"); self.frame_slider.set(0); self.frame_slider.grid(row=0, column=0, sticky="ew")
+        self.frame_info_label = ctk.CTkLabel(scrub_frame, text="", text_color="gray"); self.frame_info_label.grid(row=0, column=1, padx=(10, 0))
+        self.draft_length_select = ctk.CTkOptionMenu(scrub_frame, values=["5 s"], width=100); self.draft_length_select.grid(row=0, column=2, padx=(10, 0))
+        self.draft_button = ctk.CTkButton(scrub_frame, width=70, command=self.on_draft_clicked, state=tk.DISABLED); self.draft_button.grid(row=0, column=3, padx=(10, 0))
 
     def _create_settings_tabs(self):
         self.tab_view = ctk.CTkTabview(self, width=400); self.tab_view.grid(row=1, column=1, padx=(0, 20), pady=20, sticky="nsew")
         
         quality_title = self.lang_manager.get_string("quality_tab", "title")
         advanced_title = self.lang_manager.get_string("advanced_tab", "title")
+        queue_title = self.lang_manager.get_string("queue_tab", "title")
+        history_title = self.lang_manager.get_string("history_tab", "title")
         log_title = self.lang_manager.get_string("log_tab", "title")
         
-        self.tab_view.add(quality_title); self.tab_view.add(advanced_title); self.tab_view.add(log_title)
+        self.tab_view.add(quality_title); self.tab_view.add(advanced_title); self.tab_view.add(queue_title); self.tab_view.add(history_title); self.tab_view.add(log_title)
         
         self._populate_quality_tab(self.tab_view.tab(quality_title))
         self._populate_advanced_tab(self.tab_view.tab(advanced_title))
+        self._populate_queue_tab(self.tab_view.tab(queue_title))
+        self._populate_history_tab(self.tab_view.tab(history_title))
         self._populate_log_tab(self.tab_view.tab(log_title))
 
     def _create_status_bar(self):
         status_frame = ctk.CTkFrame(self, fg_color="transparent"); status_frame.grid(row=2, column=0, columnspan=2, padx=20, pady=(0, 10), sticky="ew")
         self.status_label = ctk.CTkLabel(status_frame); self.status_label.pack(side="left")
-        self.progress_bar = ctk.CTkProgressBar(status_frame, width=300, mode='indeterminate')
 
     def _populate_quality_tab(self, tab):
         self.q_header = ctk.CTkLabel(tab, font=ctk.CTkFont(size=14, weight="bold")); self.q_header.pack(anchor="w", padx=10, pady=10)
         self.q_instruction = ctk.CTkLabel(tab); self.q_instruction.pack(anchor="w", padx=10)
         self.color_swatch = ctk.CTkLabel(tab, text="", fg_color=self.chroma_key_color or "white", width=30, height=30, corner_radius=6); self.color_swatch.pack(anchor="w", padx=10, pady=10)
+        self.auto_key_button = ctk.CTkButton(tab, command=self.on_auto_key_clicked); self.auto_key_button.pack(anchor="w", padx=10, pady=(0, 10))
         
         self.tolerance_label, self.tolerance_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("tolerance"))
         self.tolerance_input = ctk.CTkEntry(tab); self.tolerance_input.insert(0, "0.15"); self.tolerance_input.pack(fill="x", padx=10, pady=(0,5))
+        self.tolerance_input.bind("<KeyRelease>", lambda e: self.update_preview_display())
         
         self.blend_label = ctk.CTkLabel(tab, font=ctk.CTkFont(weight="bold")); self.blend_label.pack(anchor="w", padx=10, pady=(10,0))
         self.blend_entry = ctk.CTkEntry(tab); self.blend_entry.insert(0, "0.1"); self.blend_entry.pack(fill="x", padx=10)
+        self.blend_entry.bind("<KeyRelease>", lambda e: self.update_preview_display())
         
         self.denoise_label, self.denoise_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("denoise"))
         self._create_denoise_slider(tab)
         
         self.despill_label, self.despill_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("despill"))
         self._create_despill_toggle(tab)
+        self.keyer_label = ctk.CTkLabel(tab, font=ctk.CTkFont(weight="bold")); self.keyer_label.pack(anchor="w", padx=10, pady=(10,0))
+        self.keyer_select = ctk.CTkOptionMenu(tab, values=list(KEYER_LABELS.values()), command=self.on_keyer_change); self.keyer_select.pack(fill="x", padx=10, pady=5)
+        self.keyed_preview_checkbox = ctk.CTkCheckBox(tab, command=self.update_preview_display); self.keyed_preview_checkbox.select(); self.keyed_preview_checkbox.pack(anchor="w", padx=10, pady=(20, 5))
 
     def _populate_advanced_tab(self, tab):
         self.hw_accel_label, self.hw_accel_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("hw_accel"))
@@ -180,16 +270,44 @@ class StingerChromaRemover(ctk.CTk):
         
         self.crf_label_widget, self.crf_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("crf"))
         self._create_crf_slider(tab)
+
+        self.target_size_label, self.target_size_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("target_size"))
+        self.target_size_entry = ctk.CTkEntry(tab, placeholder_text="MB"); self.target_size_entry.pack(fill="x", padx=10)
         
         self.speed_label_widget, self.speed_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("speed"))
         self._create_speed_slider(tab)
+
+        self.encoder_profile_label, self.encoder_profile_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("encoder_profile"))
+        self.encoder_profile_select = ctk.CTkOptionMenu(tab, values=[name.capitalize() for name in engine.ENCODER_PROFILES]); self.encoder_profile_select.set("Balanced"); self.encoder_profile_select.pack(fill="x", padx=10, pady=5)
+
+        self.output_format_label, self.output_format_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("output_format"))
+        format_labels = [engine.OUTPUT_FORMATS[name]["label"] for name in capabilities.supported_output_formats(self.ffmpeg_capabilities)] or [engine.OUTPUT_FORMATS["webm"]["label"]]
+        self.output_format_select = ctk.CTkOptionMenu(tab, values=format_labels); self.output_format_select.set(format_labels[0]); self.output_format_select.pack(fill="x", padx=10, pady=5)
         
         self.fps_label_widget, self.fps_help_button = self._create_control_with_help(tab, lambda: self._show_help_message("fps"))
         self._create_fps_slider(tab)
         
         self.audio_bitrate_label = ctk.CTkLabel(tab, font=ctk.CTkFont(weight="bold")); self.audio_bitrate_label.pack(anchor="w", padx=10, pady=(10,0))
         self.audio_bitrate_entry = ctk.CTkEntry(tab); self.audio_bitrate_entry.insert(0, "128k"); self.audio_bitrate_entry.pack(fill="x", padx=10)
-        self.no_audio_checkbox = ctk.CTkCheckBox(tab, command=self.on_audio_toggle); self.no_audio_checkbox.pack(anchor="w", padx=10, pady=20)
+        self.no_audio_checkbox = ctk.CTkCheckBox(tab, command=self.on_audio_toggle); self.no_audio_checkbox.pack(anchor="w", padx=10, pady=(20, 5))
+        self.split_encode_checkbox = ctk.CTkCheckBox(tab); self.split_encode_checkbox.pack(anchor="w", padx=10, pady=5)
+
+    def _populate_queue_tab(self, tab):
+        f = ctk.CTkFrame(tab, fg_color="transparent"); f.pack(fill="x", padx=10, pady=(10, 0))
+        self.concurrency_label = ctk.CTkLabel(f, font=ctk.CTkFont(weight="bold")); self.concurrency_label.pack(side="left")
+        concurrency_options = ["Auto"] + [str(n) for n in range(1, (os.cpu_count() or 1) + 1)]
+        self.concurrency_select = ctk.CTkOptionMenu(f, values=concurrency_options, width=80, command=self.on_concurrency_change); self.concurrency_select.pack(side="right")
+        self.concurrency_select.set(str(self.job_queue.max_jobs) if self.job_queue.max_jobs else "Auto")
+        self.job_list_frame = ctk.CTkScrollableFrame(tab); self.job_list_frame.pack(fill="both", expand=True, padx=5, pady=5); self.job_list_frame.grid_columnconfigure(0, weight=1)
+        self.clear_jobs_button = ctk.CTkButton(tab, command=self.job_queue.clear_finished); self.clear_jobs_button.pack(fill="x", padx=10, pady=(0, 10))
+        self.job_rows = {}
+
+    def _populate_history_tab(self, tab):
+        f = ctk.CTkFrame(tab, fg_color="transparent"); f.pack(fill="x", padx=10, pady=(10, 0))
+        self.refresh_history_button = ctk.CTkButton(f, width=80, command=self._refresh_history); self.refresh_history_button.pack(side="left")
+        self.history_baseline_button = ctk.CTkButton(f, command=self.on_history_baseline_clicked); self.history_baseline_button.pack(side="right")
+        self.history_textbox = ctk.CTkTextbox(tab, wrap="none", font=ctk.CTkFont(family="Courier", size=11)); self.history_textbox.pack(fill="both", expand=True, padx=5, pady=5)
+        self.history_textbox.configure(state="disabled")
 
     def _populate_log_tab(self, tab):
         self.log_textbox = ctk.CTkTextbox(tab, activate_scrollbars=True); self.log_textbox.pack(fill="both", expand=True, padx=5, pady=5); self.log_textbox.configure(state="disabled")
@@ -205,12 +323,15 @@ class StingerChromaRemover(ctk.CTk):
         self.denoise_slider = ctk.CTkSlider(f, from_=0, to=5, number_of_steps=20, command=self.on_denoise_slider_update); self.denoise_slider.set(0)
         self.denoise_slider.grid(row=0, column=0, sticky="ew")
         self.denoise_value_label = ctk.CTkLabel(f, text="0.0", width=30); self.denoise_value_label.grid(row=0, column=1, padx=(10,0))
+        self.denoise_cache_label = ctk.CTkLabel(parent, text="", text_color="gray", font=ctk.CTkFont(size=11)); self.denoise_cache_label.pack(anchor="w", padx=10)
 
     def _create_despill_toggle(self, parent):
-        self.despill_checkbox = ctk.CTkCheckBox(parent); self.despill_checkbox.pack(anchor="w", padx=10, pady=5)
+        self.despill_checkbox = ctk.CTkCheckBox(parent, command=self.update_preview_display); self.despill_checkbox.pack(anchor="w", padx=10, pady=5)
     
     def _create_gpu_select(self, parent):
-        self.gpu_select = ctk.CTkOptionMenu(parent, values=["None (CPU Only)", "NVIDIA (CUDA)", "Intel (QSV)", "AMD (d3d11va)"]); self.gpu_select.pack(fill="x", padx=10, pady=5)
+        # Only decoders this ffmpeg build was compiled with are offered; Auto times them on the source when the job starts.
+        values = [capabilities.AUTO_LABEL] + [capabilities.HWACCEL_LABELS[name] for name in capabilities.supported_hwaccels(self.ffmpeg_capabilities)]
+        self.gpu_select = ctk.CTkOptionMenu(parent, values=values); self.gpu_select.set(capabilities.HWACCEL_LABELS["none"]); self.gpu_select.pack(fill="x", padx=10, pady=5)
 
     def _create_crf_slider(self, parent):
         f = ctk.CTkFrame(parent, fg_color="transparent"); f.pack(fill="x", padx=10, pady=5); f.grid_columnconfigure(0, weight=1)
@@ -232,25 +353,12 @@ class StingerChromaRemover(ctk.CTk):
         self.fps_slider.grid(row=0, column=1, sticky="ew", padx=10)
         self.fps_value_label = ctk.CTkLabel(f, text="30", width=30); self.fps_value_label.grid(row=0, column=2)
 
-    def _collect_interactive_widgets(self):
-        self.interactive_widgets = [
-            self.select_video_button, self.language_menu,
-            self.tolerance_input, self.blend_entry, self.denoise_slider, self.despill_checkbox,
-            self.gpu_select, self.resolution_entry, self.crf_slider, self.speed_slider,
-            self.keep_fps_checkbox, self.fps_slider, self.audio_bitrate_entry, self.no_audio_checkbox,
-            self.tolerance_help_button, self.denoise_help_button, self.despill_help_button,
-            self.hw_accel_help_button, self.crf_help_button, self.speed_help_button, self.fps_help_button
-        ]
-
     def on_crf_slider_update(self, val): self.crf_value_label.configure(text=f"{int(val)}")
     def on_denoise_slider_update(self, val): self.denoise_value_label.configure(text=f"{val:.1f}")
     def on_speed_slider_update(self, val): self.speed_value_label.configure(text=f"{int(val)}")
     def on_fps_slider_update(self, val): self.fps_value_label.configure(text=f"{int(val)}")
 
-    def _find_ffmpeg_executable(self):
-        name = "ffmpeg.exe" if sys.platform == "win32" else "ffmpeg"; local_path = os.path.join(os.path.dirname(os.path.abspath(sys.argv[0])), name)
-        if os.path.exists(local_path): return local_path
-        return shutil.which(name)
+    def _find_ffmpeg_executable(self): return engine.find_ffmpeg_executable()
 
     def update_ffmpeg_status_text(self):
         if self.ffmpeg_executable_path:
@@ -262,22 +370,88 @@ class StingerChromaRemover(ctk.CTk):
         if self.lang_manager.load_language(language_name):
             self.tab_view.destroy()
             self._create_settings_tabs()
-            self._collect_interactive_widgets()
             self.update_ui_text()
 
     def update_log_from_queue(self):
+        # The only polling loop for the app's lifetime: it drains log lines in one batch and refreshes the job queue from its latest state.
+        lines = []
         try:
-            while True:
-                line = self.conversion_queue.get_nowait()
-                self.log_textbox.configure(state="normal"); self.log_textbox.insert("end", line); self.log_textbox.see("end"); self.log_textbox.configure(state="disabled")
+            while True: lines.append(self.conversion_queue.get_nowait())
         except queue.Empty: pass
+        if lines: self._append_log("".join(lines))
+        self._refresh_job_queue()
         self.after(100, self.update_log_from_queue)
 
+    def _append_log(self, text):
+        self.log_textbox.configure(state="normal"); self.log_textbox.insert("end", text)
+        excess = int(self.log_textbox.index("end-1c").split(".")[0]) - LOG_MAX_LINES
+        if excess > 0: self.log_textbox.delete("1.0", f"{excess + 1}.0")
+        self.log_textbox.see("end"); self.log_textbox.configure(state="disabled")
+
+    def _refresh_job_queue(self):
+        if self.job_queue.revision != self.job_queue_revision:
+            self.job_queue_revision = self.job_queue.revision
+            self._rebuild_job_rows(); self._report_finished_jobs()
+        for job in list(self.job_queue.jobs):
+            row = self.job_rows.get(job.id)
+            if row and job.state == "running" and job.progress: self._show_job_progress(row, job)
+
+    def _rebuild_job_rows(self):
+        for child in self.job_list_frame.winfo_children(): child.destroy()
+        self.job_rows = {}
+        if not self.job_queue.jobs:
+            ctk.CTkLabel(self.job_list_frame, text=self.lang_manager.get_string("queue_tab", "empty_message"), text_color="gray").grid(row=0, column=0, pady=10)
+        colors = {"running": "yellow", "done": "lightgreen", "failed": "red", "cancelled": "orange"}
+        for i, job in enumerate(list(self.job_queue.jobs)):
+            f = ctk.CTkFrame(self.job_list_frame); f.grid(row=i, column=0, sticky="ew", pady=2); f.grid_columnconfigure(0, weight=1)
+            ctk.CTkLabel(f, text=job.name, font=ctk.CTkFont(weight="bold"), anchor="w").grid(row=0, column=0, sticky="ew", padx=5)
+            detail = ctk.CTkLabel(f, text=job.message or job.state.capitalize(), text_color=colors.get(job.state, "gray"), anchor="w"); detail.grid(row=2, column=0, columnspan=2, sticky="ew", padx=5)
+            bar = ctk.CTkProgressBar(f, mode='determinate'); bar.set(1 if job.state == "done" else 0); bar.grid(row=1, column=0, columnspan=2, sticky="ew", padx=5, pady=2)
+            if job.state in jobs.ACTIVE_STATES:
+                ctk.CTkButton(f, text=self.lang_manager.get_string("queue_tab", "cancel_button"), width=60, fg_color=("#F44336", "#D32F2F"), hover_color=("#E57373", "#B71C1C"),
+                              command=lambda job_id=job.id: self.job_queue.cancel(job_id)).grid(row=0, column=1, padx=5, pady=2)
+            self.job_rows[job.id] = (bar, detail)
+
+    def _show_job_progress(self, row, job):
+        bar, detail = row
+        fraction, eta = engine.progress_fraction_eta(job.progress, job.duration)
+        parts = [f"{job.progress['fps']:.1f} fps", f"{job.progress['speed']:.2f}x"]
+        if fraction is not None: bar.set(fraction); parts.insert(0, f"{fraction * 100:.0f}%")
+        if eta is not None: parts.append(f"ETA {int(eta) // 60}:{int(eta) % 60:02d}")
+        detail.configure(text=" | ".join(parts))
+
+    def _report_finished_jobs(self):
+        # Finished jobs are reported in the status bar only; a dialog per job would interrupt whoever is setting up the next one.
+        for job in list(self.job_queue.jobs):
+            previous = self.job_states.get(job.id); self.job_states[job.id] = job.state
+            if previous not in jobs.ACTIVE_STATES or job.state == previous: continue
+            if job.state in ("done", "failed"): self._refresh_history()
+            if job.state == "done":
+                self.update_denoise_cache_text()
+                self.status_label.configure(text=f"Success! Saved as {job.name}", text_color="lightgreen")
+            elif job.state == "failed": self.status_label.configure(text=f"{job.name} failed. See log.", text_color="red")
+            elif job.state == "cancelled": self.status_label.configure(text=f"{job.name} cancelled.", text_color="orange")
+
+    def _refresh_history(self):
+        # Newest runs first, then the per-stage profile of the latest one.
+        runs = self.run_history.runs[-50:]
+        text = history.format_report(self.run_history, runs[::-1]) + "\n\n" + history.format_stages(runs[-1]) if runs else self.lang_manager.get_string("history_tab", "empty_message")
+        self.history_textbox.configure(state="normal"); self.history_textbox.delete("1.0", "end"); self.history_textbox.insert("end", text)
+        self.history_textbox.configure(state="disabled")
+
+    def on_history_baseline_clicked(self):
+        if not self.run_history.runs: return
+        run = self.run_history.set_baseline(self.run_history.runs[-1]["id"])
+        self.status_label.configure(text=f"Baseline for {run['preset']} set to run {run['id'][:8]}.", text_color="white")
+        self._refresh_history()
+
+    def on_concurrency_change(self, value):
+        self.job_queue.set_max_jobs(None if value == "Auto" else int(value))
+
     def on_audio_toggle(self): self.audio_bitrate_entry.configure(state="disabled" if self.no_audio_checkbox.get() else "normal")
     def on_fps_toggle(self): self.fps_slider.configure(state="disabled" if self.keep_fps_checkbox.get() else "normal")
 
     def select_video_file(self):
-        if self.is_converting: return
         self.source_video_path = filedialog.askopenfilename(filetypes=(("MP4 files", "*.mp4"), ("All files", "*.*")))
         if not self.source_video_path: return
         self.file_label.configure(text=os.path.basename(self.source_video_path), text_color="white")
@@ -285,144 +459,246 @@ class StingerChromaRemover(ctk.CTk):
         self.after(50, self.load_and_display_preview)
 
     def load_and_display_preview(self):
+        if self.draft_renderer: self._stop_draft()
         try:
+            started = time.perf_counter()
+            if load_video_modules(): self.conversion_queue.put(f"Loaded video modules in {(time.perf_counter() - started) * 1000:.0f} ms\n")
             cap = cv2.VideoCapture(self.source_video_path); ret, frame = cap.read(); cap.release()
             if not ret: raise ValueError("Could not read frame.")
             self.preview_image_original = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
             h, w, _ = self.preview_image_original.shape
+            self.preview_source_size = (w, h)
             self.resolution_entry.delete(0, 'end'); self.resolution_entry.insert(0, f"{w}x{h}")
             canvas_w, canvas_h = self.preview_canvas.winfo_width(), self.preview_canvas.winfo_height()
             if canvas_w < 20: canvas_w, canvas_h = 600, 600
             img_ratio = w / h; canvas_ratio = canvas_w / canvas_h
             new_w = canvas_w if img_ratio > canvas_ratio else int(canvas_h * img_ratio)
             new_h = int(new_w / img_ratio) if img_ratio > canvas_ratio else canvas_h
-            display_frame = cv2.resize(self.preview_image_original, (new_w, new_h), interpolation=cv2.INTER_AREA)
-            self.preview_image_tk = ImageTk.PhotoImage(image=Image.fromarray(display_frame))
-            self.preview_canvas.create_image(canvas_w/2, canvas_h/2, anchor="center", image=self.preview_image_tk)
+            self.preview_keyer = keyer.PreviewKeyer(self.preview_image_original, (new_w, new_h))
+            self.preview_center = (canvas_w/2, canvas_h/2)
+            self._open_frame_server((new_w, new_h))
+            self.update_preview_display()
         except Exception as e: messagebox.showerror("Frame Error", f"Failed to load video frame. Error: {e}")
 
-    def on_preview_clicked(self, event):
-        if self.preview_image_original is None or self.is_converting: return
+    def _open_frame_server(self, size):
+        if self.frame_server: self.frame_server.stop()
+        self.frame_server = frames.FrameServer(self.source_video_path, size)
+        self.frame_server.cache.put(0, self.preview_keyer.frame)
+        last_frame = self.frame_server.frame_count - 1; self.scrub_index = 0
+        self.frame_slider.configure(from_=0, to=max(1, last_frame), number_of_steps=max(1, last_frame), state="normal" if last_frame > 0 else "disabled"); self.frame_slider.set(0)
+        self._update_frame_info()
+
+    def on_frame_scrub(self, val):
+        if not self.frame_server: return
+        self.scrub_index = int(round(val)); self.frame_server.seek(self.scrub_index)
+        frame = self.frame_server.get(self.scrub_index)
+        if frame is not None: self._show_scrub_frame(frame)
+        elif not self.scrub_poll_pending: self.scrub_poll_pending = True; self.after(15, self._poll_scrub_frame)
+
+    def _poll_scrub_frame(self):
+        # Only the latest slider position matters; frames skipped over while dragging are never waited for.
+        server = self.frame_server
+        frame = server.get(self.scrub_index, record=False) if server else None
+        if frame is None and server and self.scrub_index not in server.unreadable: self.after(15, self._poll_scrub_frame); return
+        self.scrub_poll_pending = False
+        if frame is not None: self._show_scrub_frame(frame)
+
+    def _show_scrub_frame(self, frame):
+        self.preview_image_original = frame
+        self.preview_keyer = keyer.PreviewKeyer(frame, (frame.shape[1], frame.shape[0]))
+        self.update_preview_display(); self._update_frame_info()
+
+    def _update_frame_info(self):
+        server = self.frame_server
+        self.frame_info_label.configure(text=f"{self.scrub_index + 1}/{server.frame_count} | cache {server.cache.hit_rate() * 100:.0f}% | decode {server.average_decode_ms():.1f} ms")
+
+    def update_preview_display(self):
+        if self.preview_keyer is None or self.draft_renderer: return
+        display_frame = self.preview_keyer.frame
+        if self.chroma_key_color and self.keyed_preview_checkbox.get():
+            try:
+                similarity, blend = float(self.tolerance_input.get()), float(self.blend_entry.get())
+                display_frame = self.preview_keyer.render(self.chroma_key_color, similarity, blend, despill=bool(self.despill_checkbox.get()), keyer=self._selected_keyer())
+            except ValueError: pass
+        self._show_preview_image(display_frame)
+
+    def _selected_keyer(self):
+        return next((name for name, label in KEYER_LABELS.items() if label == self.keyer_select.get()), "ffmpeg")
+
+    def on_keyer_change(self, value=None):
+        # Draft playback streams ffmpeg's own filter output, so it is only offered when that is the keyer being used.
+        if self.chroma_key_color: self.draft_button.configure(state=tk.NORMAL if self._selected_keyer() == "ffmpeg" else tk.DISABLED)
+        self.update_preview_display()
+
+    def _show_preview_image(self, frame):
+        self.preview_image_tk = ImageTk.PhotoImage(image=Image.fromarray(frame))
+        self.preview_canvas.delete("all"); self.preview_canvas.create_image(*self.preview_center, anchor="center", image=self.preview_image_tk)
+
+    def on_draft_clicked(self):
+        if self.draft_renderer: self._stop_draft(); return
+        if self.preview_keyer is None or not self.chroma_key_color: return
+        params = self._read_quality_params()
+        if params is None: return
+        # Auto would benchmark every decoder before the first frame; a draft should start at once.
+        engine_params = self._collect_engine_params(params)
+        if engine_params["hwaccel"] == "auto": engine_params["hwaccel"] = "none"
+        engine_params = capabilities.resolve_params(self.ffmpeg_executable_path, self.source_video_path, engine_params, self.ffmpeg_capabilities, on_output=self.conversion_queue.put)
+        height, width = self.preview_keyer.frame.shape[:2]; size = (width - width % 2, height - height % 2)
+        length = self.draft_length_select.get(); source_fps = self.frame_server.fps
+        start, duration = (0.0, None) if length == self.lang_manager.get_string("draft_whole_clip") else (self.scrub_index / source_fps, float(length.split()[0]))
+        command = engine.build_draft_command(self.ffmpeg_executable_path, self.source_video_path, engine_params, size, start, duration)
+        self.conversion_queue.put("Draft: " + " ".join(command) + "\n")
+        self.draft_fps = engine_params["fps"] or source_fps
+        self.draft_renderer = frames.DraftRenderer(command, size)
+        self.draft_button.configure(text=self.lang_manager.get_string("draft_stop_button"))
+        self.status_label.configure(text="Rendering draft...", text_color="yellow")
+        self._play_draft_frame()
+
+    def _play_draft_frame(self):
+        renderer = self.draft_renderer
+        if renderer is None: return
+        frame = renderer.next_frame()
+        if frame is not None: self._show_preview_image(frame)
+        if renderer.finished(): self._stop_draft(); return
+        self.after(max(1, int(1000 / self.draft_fps)), self._play_draft_frame)
+
+    def _stop_draft(self):
+        renderer, self.draft_renderer = self.draft_renderer, None
+        renderer.stop()
+        self.draft_button.configure(text=self.lang_manager.get_string("draft_button"))
+        if renderer.error:
+            self.conversion_queue.put(renderer.error + "\n")
+            self.status_label.configure(text="Draft failed. See log.", text_color="red")
+        else: self.status_label.configure(text=f"Draft: {renderer.frame_count} frames rendered at {renderer.render_fps():.0f} fps.", text_color="white")
+        self.update_preview_display()
+
+    def _canvas_to_image(self, x, y, clamp=False):
+        # Returns the canvas point as fractions of the displayed frame, or None when it falls outside it.
         canvas_w, canvas_h = self.preview_canvas.winfo_width(), self.preview_canvas.winfo_height()
         img_w, img_h = self.preview_image_tk.width(), self.preview_image_tk.height()
-        offset_x, offset_y = (canvas_w - img_w) / 2, (canvas_h - img_h) / 2
-        if not (offset_x <= event.x < offset_x + img_w and offset_y <= event.y < offset_y + img_h): return
-        img_x, img_y = event.x - offset_x, event.y - offset_y
+        fx, fy = (x - (canvas_w - img_w) / 2) / img_w, (y - (canvas_h - img_h) / 2) / img_h
+        if clamp: return min(max(fx, 0.0), 1.0), min(max(fy, 0.0), 1.0)
+        return (fx, fy) if 0 <= fx < 1 and 0 <= fy < 1 else None
+
+    def on_preview_pressed(self, event):
+        self.drag_start = (event.x, event.y) if self.preview_image_original is not None and not self.draft_renderer else None
+
+    def on_preview_dragged(self, event):
+        if not self.drag_start: return
+        self.preview_canvas.delete("region")
+        self.preview_canvas.create_rectangle(*self.drag_start, event.x, event.y, outline="#ffcc00", dash=(4, 2), tags="region")
+
+    def on_preview_released(self, event):
+        if not self.drag_start: return
+        (x0, y0), self.drag_start = self.drag_start, None
+        self.preview_canvas.delete("region")
+        # A press that barely moves is a click and picks a single pixel; a real drag marks the area for Auto Key.
+        if abs(event.x - x0) < 6 and abs(event.y - y0) < 6: self.on_preview_clicked(event); return
+        (ax, ay), (bx, by) = self._canvas_to_image(x0, y0, clamp=True), self._canvas_to_image(event.x, event.y, clamp=True)
+        if abs(bx - ax) > 0.005 and abs(by - ay) > 0.005: self.on_auto_key_clicked((min(ax, bx), min(ay, by), max(ax, bx), max(ay, by)))
+
+    def on_preview_clicked(self, event):
+        if self.preview_image_original is None: return
+        point = self._canvas_to_image(event.x, event.y)
+        if point is None: return
         orig_h, orig_w, _ = self.preview_image_original.shape
-        orig_x, orig_y = int((img_x / img_w) * orig_w), int((img_y / img_h) * orig_h)
-        r, g, b = self.preview_image_original[orig_y, orig_x]
+        r, g, b = self.preview_image_original[int(point[1] * orig_h), int(point[0] * orig_w)]
         self.chroma_key_color = f"#{r:02x}{g:02x}{b:02x}"
         self.color_swatch.configure(fg_color=self.chroma_key_color)
         status_text = self.lang_manager.get_string("color_selected_message").format(color=self.chroma_key_color.upper())
         self.status_label.configure(text=status_text, text_color="white")
-        self.convert_button.configure(state=tk.NORMAL)
+        self.convert_button.configure(state=tk.NORMAL); self.on_keyer_change()
+        self.update_preview_display()
+
+    def on_auto_key_clicked(self, region=None):
+        if self.preview_image_original is None or self.auto_key_running: return
+        if not self.ffmpeg_executable_path: self._show_help_message("ffmpeg_not_found"); return
+        self.auto_key_running = True; self.auto_key_button.configure(state=tk.DISABLED)
+        self.status_label.configure(text="Sampling frames for Auto Key...", text_color="yellow")
+        threading.Thread(target=self._run_auto_key, args=(self.source_video_path, region, self._selected_keyer()), daemon=True).start()
+
+    def _run_auto_key(self, source_path, region, keyer_name):
+        started = time.perf_counter()
+        try:
+            info = engine.probe_video(self.ffmpeg_executable_path, source_path)
+            sampled = keyer.sample_frames(self.ffmpeg_executable_path, source_path, info["duration"], (info["width"], info["height"]))
+            estimate = keyer.estimate_key(sampled, region, keyer_name) if sampled else None
+            error = None
+        except Exception as e: estimate, error = None, str(e)
+        elapsed = time.perf_counter() - started
+        self.after(0, lambda: self._apply_auto_key(estimate, error, elapsed))
+
+    def _apply_auto_key(self, estimate, error, elapsed):
+        self.auto_key_running = False; self.auto_key_button.configure(state=tk.NORMAL)
+        if estimate is None:
+            if error: self.conversion_queue.put(f"Auto Key failed: {error}\n")
+            self.status_label.configure(text="Auto Key found no key color. Try dragging a box over the background.", text_color="orange"); return
+        self.chroma_key_color = estimate["color"]
+        self.color_swatch.configure(fg_color=self.chroma_key_color)
+        self.tolerance_input.delete(0, 'end'); self.tolerance_input.insert(0, str(estimate["similarity"]))
+        self.blend_entry.delete(0, 'end'); self.blend_entry.insert(0, str(estimate["blend"]))
+        self.conversion_queue.put(f"Auto Key: {self.chroma_key_color} similarity {estimate['similarity']} blend {estimate['blend']} "
+                                  f"({estimate['coverage'] * 100:.0f}% of {estimate['frames']} sampled frames, {elapsed * 1000:.0f} ms)\n")
+        self.status_label.configure(text=f"Auto Key: {self.chroma_key_color.upper()} from {estimate['frames']} frames in {elapsed:.2f}s.", text_color="white")
+        self.convert_button.configure(state=tk.NORMAL); self.on_keyer_change()
     
-    def _set_ui_conversion_state(self, is_converting):
-        self.is_converting = is_converting
-        state = "disabled" if is_converting else "normal"
-
-        for widget in self.interactive_widgets:
-            widget.configure(state=state)
-        
-        if not is_converting:
-            self.on_fps_toggle()
-            self.on_audio_toggle()
-
-        if is_converting:
-            cancel_text = self.lang_manager.get_string("cancel_button", default="Cancel")
-            self.convert_button.configure(text=cancel_text, command=self.cancel_conversion, fg_color=("#F44336", "#D32F2F"), hover_color=("#E57373", "#B71C1C"))
-            self.progress_bar.pack(side="right", padx=10); self.progress_bar.start()
-        else:
-            self.convert_button.configure(text=self.lang_manager.get_string("step3_button"), command=self.start_conversion_process, fg_color=self.default_button_color, hover_color=self.default_button_hover_color)
-            self.progress_bar.stop(); self.progress_bar.pack_forget()
-
     def start_conversion_process(self):
-        if self.is_converting: return
         if not self.ffmpeg_executable_path:
             self._show_help_message("ffmpeg_not_found"); return
-        output_path = filedialog.asksaveasfilename(defaultextension=".webm", filetypes=[("WEBM Video", "*.webm")])
+        fmt = engine.OUTPUT_FORMATS[self._selected_output_format()]
+        output_path = filedialog.asksaveasfilename(defaultextension=fmt["extension"], filetypes=[(fmt["label"], "*" + fmt["extension"])])
         if not output_path: return
-        
-        try:
-            params = {"similarity": float(self.tolerance_input.get()),"blend": float(self.blend_entry.get()),"crf": int(self.crf_slider.get()),"denoise": self.denoise_slider.get()}
-        except ValueError:
-            messagebox.showerror("Invalid Input", "Tolerance and Blend must be valid numbers."); return
-        
-        self._set_ui_conversion_state(is_converting=True)
-        self.status_label.configure(text="Converting, please wait...", text_color="yellow")
-        self.log_textbox.configure(state="normal"); self.log_textbox.delete("1.0", "end"); self.log_textbox.configure(state="disabled")
-        
-        command = self._build_ffmpeg_command(output_path, params)
-        threading.Thread(target=self.execute_ffmpeg_in_thread, args=(command, output_path), daemon=True).start()
-        self.update_log_from_queue()
+        params = self._read_quality_params()
+        if params is None: return
+        job = self.job_queue.add(self.source_video_path, output_path, self._collect_engine_params(params), split=bool(self.split_encode_checkbox.get()))
+        self.status_label.configure(text=f"Queued {job.name}. Keep tuning or queue the next one.", text_color="white")
 
-    def cancel_conversion(self):
-        if self.ffmpeg_process and self.is_converting:
-            try:
-                self.ffmpeg_process.terminate()
-                self.status_label.configure(text="Conversion cancelled.", text_color="orange")
-            except Exception as e:
-                print(f"Error terminating process: {e}")
-            self.is_converting = False
-
-    def _build_ffmpeg_command(self, output_path, params):
-        pre_input_args = []; gpu_selection = self.gpu_select.get()
-        if "NVIDIA" in gpu_selection: pre_input_args.extend(['-hwaccel', 'cuda'])
-        elif "Intel" in gpu_selection: pre_input_args.extend(['-hwaccel', 'qsv', '-hwaccel_output_format', 'qsv'])
-        elif "AMD" in gpu_selection: pre_input_args.extend(['-hwaccel', 'd3d11va'])
-        command = [self.ffmpeg_executable_path] + pre_input_args + ['-i', self.source_video_path]
-        vf_filters = []
-        if params["denoise"] > 0: vf_filters.append(f"nlmeans=strength={params['denoise']}")
-        vf_filters.append(f"chromakey=color={self.chroma_key_color}:similarity={params['similarity']}:blend={params['blend']}")
-        if self.despill_checkbox.get(): vf_filters.append("despill")
-        if self.resolution_entry.get(): vf_filters.append(f"scale={self.resolution_entry.get()}")
-        command.extend(['-vf', ",".join(vf_filters)])
-        encoder_opts = ['-c:v', 'libvpx-vp9', '-crf', str(params['crf']), '-b:v', '0', '-pix_fmt', 'yuva420p']
-        encoder_opts.extend(['-speed', f"{int(self.speed_slider.get())}"])
-        command.extend(encoder_opts)
-        if not self.keep_fps_checkbox.get(): command.extend(['-r', f"{int(self.fps_slider.get())}"])
-        if self.no_audio_checkbox.get(): command.append('-an')
-        elif self.audio_bitrate_entry.get(): command.extend(['-c:a', 'libvorbis', '-b:a', self.audio_bitrate_entry.get()])
-        command.extend(['-y', output_path])
-        return command
-
-    def execute_ffmpeg_in_thread(self, command, output_path):
+    def _read_quality_params(self):
         try:
-            self.ffmpeg_process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, universal_newlines=True, creationflags=subprocess.CREATE_NO_WINDOW if os.name == 'nt' else 0)
-            for line in iter(self.ffmpeg_process.stdout.readline, ''):
-                self.conversion_queue.put(line)
-            self.ffmpeg_process.stdout.close()
-            return_code = self.ffmpeg_process.wait()
-
-            if self.is_converting:
-                if return_code == 0:
-                    self.after(0, self.on_conversion_success, output_path)
-                else:
-                    raise subprocess.CalledProcessError(return_code, command)
-        except Exception as e:
-            self.after(0, self.on_conversion_error, e)
-    
-    def on_conversion_success(self, output_path):
-        self._set_ui_conversion_state(is_converting=False)
-        self.status_label.configure(text=f"Success! Saved as {os.path.basename(output_path)}", text_color="lightgreen")
-        messagebox.showinfo("Success!", f"Video converted successfully!\n\nSaved to: {output_path}")
-
-    def on_conversion_error(self, error):
-        was_cancelled = not self.is_converting
-        self._set_ui_conversion_state(is_converting=False)
-        if not was_cancelled:
-            self.status_label.configure(text="Conversion failed. See log.", text_color="red")
-            messagebox.showerror("FFmpeg Error", f"An error occurred during conversion. See the Log tab for details.\n\nError: {error}")
+            target = self.target_size_entry.get().strip()
+            params = {"similarity": float(self.tolerance_input.get()),"blend": float(self.blend_entry.get()),"crf": int(self.crf_slider.get()),"denoise": self.denoise_slider.get(),
+                      "target_size_mb": float(target) if target else None}
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Tolerance, Blend and Target Size must be valid numbers."); return None
+        if params["target_size_mb"] is not None and (params["target_size_mb"] <= 0 or self._selected_output_format() != "webm"):
+            messagebox.showerror("Invalid Input", "Target Size needs a positive size in MB and the WebM (VP9) output format."); return None
+        return params
+
+    def _collect_engine_params(self, params):
+        gpu_selection = self.gpu_select.get()
+        hwaccel = "auto" if gpu_selection == capabilities.AUTO_LABEL else next((name for name, label in capabilities.HWACCEL_LABELS.items() if label == gpu_selection), "none")
+        return engine.make_params(color=self.chroma_key_color, similarity=params["similarity"], blend=params["blend"], denoise=params["denoise"],
+                                  despill=bool(self.despill_checkbox.get()), resolution=self.resolution_entry.get(), crf=params["crf"],
+                                  speed=int(self.speed_slider.get()), fps=None if self.keep_fps_checkbox.get() else int(self.fps_slider.get()),
+                                  audio_bitrate=self.audio_bitrate_entry.get(), no_audio=bool(self.no_audio_checkbox.get()), hwaccel=hwaccel,
+                                  profile=self.encoder_profile_select.get().lower(), keyer=self._selected_keyer(), output_format=self._selected_output_format(), target_size_mb=params.get("target_size_mb"), source_width=self.preview_source_size[0], source_height=self.preview_source_size[1])
+
+    def _selected_output_format(self):
+        return next((name for name, fmt in engine.OUTPUT_FORMATS.items() if fmt["label"] == self.output_format_select.get()), "webm")
+
+    def update_denoise_cache_text(self):
+        if self.intermediate_cache.hits or self.intermediate_cache.misses:
+            self.denoise_cache_label.configure(text=f"Denoise cache: {self.intermediate_cache.summary()}")
 
     def _show_help_message(self, key):
         title = self.lang_manager.get_string("help", f"{key}_title")
         message = self.lang_manager.get_string("help", f"{key}_msg")
         messagebox.showinfo(title, message)
         
+def finish_startup_report(app):
+    # Runs once the window has drawn for the first time. With --startup-report the timings are printed and the app exits, so runs can be compared.
+    startup_timer.mark("first window draw")
+    app.conversion_queue.put("Startup timings:\n" + startup_timer.report() + "\n")
+    if "--startup-report" in sys.argv:
+        print(startup_timer.report()); app.destroy()
+
 if __name__ == "__main__":
     try:
         lang_manager = LanguageManager()
+        startup_timer.mark("scan languages")
         app = StingerChromaRemover(lang_manager)
+        startup_timer.mark("build widgets")
+        app.after_idle(finish_startup_report, app)
         app.mainloop()
     except Exception as e:
         root = tk.Tk(); root.withdraw()
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+import engine
+import planner
+
+DEFAULT_MAX_BYTES = 10 * 1024 ** 3
+
+def default_cache_dir():
+    return engine.user_data_path("cache", "intermediates")
+
+class IntermediateCache:
+    # Denoised (and, for downscales, pre-scaled) copies of sources, stored losslessly so that retuning the key or the
+    # encoder skips nlmeans. Entries are keyed by source identity and the settings baked into them, and evicted
+    # least-recently-used first once the directory grows past max_bytes. Params need source_width and source_height
+    # so the planner can tell a downscale from an upscale.
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.bytes_reused = 0
+        self.seconds_saved = 0.0
+        self.lock = threading.Lock()
+        self.key_locks = {}
+
+    def denoise_graph(self, params):
+        source_size = (params.get("source_width"), params.get("source_height"))
+        return planner.plan_denoise_graph(params, source_size, params.get("gpu_filters"), params.get("prescale"))
+
+    def key(self, source_path, params):
+        stat = os.stat(source_path); scaled = self.denoise_graph(params)[2]
+        size = planner.parse_resolution(params["resolution"], (params.get("source_width"), params.get("source_height"))) if scaled else None
+        identity = {"source": os.path.abspath(source_path), "mtime": stat.st_mtime_ns, "size": stat.st_size,
+                    "denoise": round(float(params["denoise"]), 3), "scale": f"{size[0]}x{size[1]}" if size else params["resolution"] if scaled else ""}
+        return hashlib.sha1(json.dumps(identity, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.cache_dir, key)
+        return base + ".mkv", base + ".json"
+
+    def path_for(self, source_path, params):
+        return self._paths(self.key(source_path, params))[0]
+
+    def build_command(self, ffmpeg_path, source_path, params, output_path):
+        input_options, filters, _ = self.denoise_graph(params)
+        return [ffmpeg_path] + input_options + ['-i', source_path, '-map', '0:v:0', '-map', '0:a?', '-vf', ",".join(filters),
+                '-c:v', 'ffv1', '-level', '3', '-slices', '16', '-threads', str(os.cpu_count() or 1), '-c:a', 'copy', '-y', output_path]
+
+    def lookup(self, source_path, params):
+        video_path, meta_path = self._paths(self.key(source_path, params))
+        if not os.path.exists(video_path): return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f: build_seconds = json.load(f).get("build_seconds", 0.0)
+        except (OSError, ValueError): build_seconds = 0.0
+        os.utime(video_path)
+        with self.lock:
+            self.hits += 1; self.bytes_reused += os.path.getsize(video_path); self.seconds_saved += build_seconds
+        return video_path
+
+    def _key_lock(self, key):
+        with self.lock: return self.key_locks.setdefault(key, threading.Lock())
+
+    def build(self, ffmpeg_path, source_path, params, on_output=None, on_start=None, on_progress=None):
+        # Jobs for the same source and denoise strength wait for each other here, so only the first one runs nlmeans.
+        key = self.key(source_path, params)
+        with self._key_lock(key):
+            cached = self.lookup(source_path, params)
+            if cached: return 0, cached
+            return self._build(ffmpeg_path, source_path, params, key, on_output, on_start, on_progress)
+
+    def _build(self, ffmpeg_path, source_path, params, key, on_output, on_start, on_progress):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        video_path, meta_path = self._paths(key)
+        handle, partial_path = tempfile.mkstemp(prefix=key + ".", suffix=".partial.mkv", dir=self.cache_dir); os.close(handle)
+        command = self.build_command(ffmpeg_path, source_path, params, partial_path)
+        started = time.perf_counter()
+        return_code = engine.run_ffmpeg(command, on_output=on_output, on_start=on_start, on_progress=on_progress)
+        with self.lock: self.misses += 1
+        if return_code != 0:
+            if os.path.exists(partial_path): os.remove(partial_path)
+            return return_code, None
+        os.replace(partial_path, video_path)
+        with open(meta_path, 'w', encoding='utf-8') as f: json.dump({"source": source_path, "build_seconds": time.perf_counter() - started}, f)
+        self.evict(keep=video_path)
+        return 0, video_path
+
+    def keying_params(self, params):
+        # What is left to do once the intermediate exists: no denoise, no scale if it was baked in, and a software decode of FFV1.
+        scaled = self.denoise_graph(params)[2]; source_size = (params.get("source_width") or 0, params.get("source_height") or 0)
+        width, height = (planner.parse_resolution(params["resolution"], source_size) if scaled else None) or source_size
+        return dict(params, denoise=0, hwaccel="none", resolution="" if scaled else params["resolution"], source_width=width, source_height=height)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.endswith(".mkv") and not name.endswith(".partial.mkv"): entries.append((os.path.getmtime(path), os.path.getsize(path), path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if path == keep: continue
+            for stale in (path, os.path.splitext(path)[0] + ".json"):
+                if os.path.exists(stale): os.remove(stale)
+            total -= size
+
+    def summary(self):
+        return f"{self.hits} hit(s), {self.misses} build(s), {self.bytes_reused / 1024 ** 2:.0f} MiB reused, {self.seconds_saved:.0f}s of denoising saved"
@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import uuid
+import threading
+import engine
+import capabilities
+import history
+
+ACTIVE_STATES = ("pending", "running")
+
+def default_queue_path():
+    return engine.user_data_path("config", "queue.json")
+
+def estimate_encoder_threads(params, cpu_count=None):
+    # libvpx keeps roughly two threads busy per tile column with row-mt, so a 1080p job saturates about eight cores.
+    cpu_count = cpu_count or os.cpu_count() or 1
+    tile_columns = engine.vp9_tile_columns(engine.output_width(params) or 1920, cpu_count)
+    return max(1, min(cpu_count, 2 << tile_columns))
+
+class Job:
+    PERSISTED = ("id", "source_path", "output_path", "params", "split", "state", "message", "created")
+
+    def __init__(self, source_path, output_path, params, split=False, id=None, state="pending", message="", created=None):
+        self.id = id or uuid.uuid4().hex[:12]
+        self.source_path = source_path
+        self.output_path = output_path
+        self.params = params
+        self.split = split
+        self.state = state
+        self.message = message
+        self.created = created or time.time()
+        self.threads = estimate_encoder_threads(params)
+        self.duration = 0.0
+        self.progress = None
+        self.processes = []
+        self.cancel_requested = False
+
+    @property
+    def name(self): return os.path.basename(self.output_path)
+
+    def to_dict(self): return {key: getattr(self, key) for key in self.PERSISTED}
+
+    @classmethod
+    def from_dict(cls, data): return cls(**{key: data[key] for key in cls.PERSISTED if key in data})
+
+class JobQueue:
+    # Jobs run in threads that each drive their own ffmpeg processes. A job starts while the estimated encoder
+    # threads of everything running fit in the CPU budget (or max_jobs, when set), and the queue is written to disk
+    # on every state change so pending and interrupted work survives a restart.
+    def __init__(self, ffmpeg_path, path=None, max_jobs=None, intermediate_cache=None, on_output=None, run_history=None):
+        self.ffmpeg_path = ffmpeg_path
+        self.run_history = run_history
+        self.path = path or default_queue_path()
+        self.max_jobs = max_jobs
+        self.intermediate_cache = intermediate_cache
+        self.on_output = on_output
+        self.revision = 0
+        self.jobs = []
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: saved = json.load(f)
+        except (OSError, ValueError): return
+        for data in saved.get("jobs", []):
+            job = Job.from_dict(data)
+            if job.state == "running": job.state, job.message = "pending", "Interrupted, restarting"
+            self.jobs.append(job)
+
+    def save(self):
+        with self.lock: data = {"jobs": [job.to_dict() for job in self.jobs]}
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f: json.dump(data, f, indent=2)
+        os.replace(temp_path, self.path)
+
+    def add(self, source_path, output_path, params, split=False):
+        job = Job(source_path, output_path, params, split)
+        with self.lock: self.jobs.append(job)
+        self._changed(); self.schedule()
+        return job
+
+    def cancel(self, job_id):
+        with self.lock:
+            job = self.get(job_id)
+            if not job or job.state not in ACTIVE_STATES: return
+            job.cancel_requested = True
+            if job.state == "pending": job.state, job.message = "cancelled", ""
+            for process in list(job.processes):
+                try:
+                    if process.poll() is None: process.terminate()
+                except Exception as e: print(f"Error terminating process: {e}")
+        self._changed()
+
+    def clear_finished(self):
+        with self.lock: self.jobs = [job for job in self.jobs if job.state in ACTIVE_STATES]
+        self._changed()
+
+    def get(self, job_id):
+        return next((job for job in self.jobs if job.id == job_id), None)
+
+    def counts(self):
+        with self.lock: return {state: sum(1 for job in self.jobs if job.state == state) for state in ("pending", "running", "done", "failed", "cancelled")}
+
+    def set_max_jobs(self, max_jobs):
+        self.max_jobs = max_jobs; self.schedule()
+
+    def _can_start(self, job, running):
+        if not running: return True
+        if self.max_jobs: return len(running) < self.max_jobs
+        return sum(r.threads for r in running) + job.threads <= (os.cpu_count() or 1)
+
+    def schedule(self):
+        with self.lock:
+            for job in self.jobs:
+                if job.state != "pending": continue
+                running = [r for r in self.jobs if r.state == "running"]
+                if not self._can_start(job, running): break
+                job.state, job.message, job.progress, job.processes, job.cancel_requested = "running", "", None, [], False
+                threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        self._changed()
+
+    def _run(self, job):
+        prefix = f"[{job.name}] "
+        on_output = (lambda line: self.on_output(prefix + line)) if self.on_output else None
+        processes = []
+        try:
+            job.duration = engine.probe_video(self.ffmpeg_path, job.source_path)["duration"]
+            params = capabilities.resolve_params(self.ffmpeg_path, job.source_path, dict(job.params, threads=job.params.get("threads") or job.threads), on_output=on_output)
+            started = time.perf_counter()
+            return_code = engine.encode(self.ffmpeg_path, job.source_path, job.output_path, params, split=job.split, on_output=on_output,
+                                        on_start=lambda process: (processes.append(process), self._on_start(job, process)), on_progress=lambda progress: setattr(job, "progress", progress),
+                                        intermediate_cache=self.intermediate_cache)
+            if job.cancel_requested: job.state, job.message = "cancelled", ""
+            elif return_code == 0: job.state, job.message = "done", ""
+            else: job.state, job.message = "failed", f"FFmpeg exited with code {return_code}"
+            # Cancelled runs say nothing about speed, so only finished and failed ones go into the history.
+            if self.run_history and not job.cancel_requested: self._record_run(job, params, processes, time.perf_counter() - started, return_code)
+        except Exception as e:
+            job.state, job.message = ("cancelled", "") if job.cancel_requested else ("failed", str(e))
+        job.processes = []
+        self.schedule()
+
+    def _record_run(self, job, params, processes, wall_time, return_code):
+        try: self.run_history.add(history.make_record(self.ffmpeg_path, job.source_path, job.output_path, params, processes, wall_time, return_code, job.split))
+        except Exception as e: print(f"Warning: Could not record run history. Error: {e}")
+
+    def _on_start(self, job, process):
+        with self.lock:
+            job.processes.append(process)
+            if job.cancel_requested: process.terminate()
+
+    def _changed(self):
+        # Callers on other threads (the GUI) watch revision instead of being called back from worker threads.
+        with self.lock: self.revision += 1
+        try: self.save()
+        except OSError as e: print(f"Warning: Could not save job queue. Error: {e}")
@@ -0,0 +1,174 @@
+import re
+import subprocess
+import numpy as np
+import cv2
+import engine
+
+# BT.601 limited-range RGB -> U/V, what swscale produces when the decoded frame reaches the filter.
+RGB_TO_UV = np.array([[-38, -74, 112], [112, -94, -18]], dtype=np.float32) / 256.0
+UV_OFFSET = np.array([128.0, 128.0], dtype=np.float32)
+
+def hex_to_rgb(color):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+def _fixnum(x): return int(round(x * (1 << 10)))
+
+def key_color_uv(color):
+    # vf_chromakey converts the key color with full-range JPEG coefficients in 10-bit fixed point.
+    r, g, b = hex_to_rgb(color)
+    u = ((-_fixnum(0.16874) * r - _fixnum(0.33126) * g + _fixnum(0.5) * b + (1 << 9) - 1) >> 10) + 128
+    v = ((_fixnum(0.5) * r - _fixnum(0.41869) * g - _fixnum(0.08131) * b + (1 << 9) - 1) >> 10) + 128
+    return u, v
+
+def rgb_to_uv(frame):
+    return cv2.transform(frame.astype(np.float32), np.hstack([RGB_TO_UV, UV_OFFSET[:, None]]))
+
+def chromakey_alpha(uv, color, similarity, blend):
+    # Mirrors vf_chromakey: per-pixel UV distance to the key, averaged over a 3x3 neighbourhood with clamped edges.
+    key_u, key_v = key_color_uv(color)
+    du = uv[..., 0] - key_u; dv = uv[..., 1] - key_v
+    distance = np.sqrt((du * du + dv * dv) / (255.0 * 255.0 * 2))
+    diff = cv2.blur(distance, (3, 3), borderType=cv2.BORDER_REPLICATE)
+    if blend > 0.0001: return np.clip((diff - similarity) / blend, 0.0, 1.0)
+    return (diff > similarity).astype(np.float32)
+
+def despill_green(frame):
+    # vf_despill defaults: green spill map against a 50/50 red/blue mix, subtracted from green only.
+    rgb = frame.astype(np.float32)
+    spill = np.maximum(rgb[..., 1] - (rgb[..., 0] + rgb[..., 2]) * 0.5, 0.0)
+    rgb[..., 1] -= spill
+    return rgb
+
+def key_color_uv_limited(color):
+    # The native keyer compares against the decoded frame's own BT.601 limited-range chroma, so the key goes through the same matrix.
+    return RGB_TO_UV @ np.array(hex_to_rgb(color), dtype=np.float32) + UV_OFFSET
+
+def native_alpha(u, v, key_uv, similarity, blend, feather=0.0):
+    # Per-pixel UV distance on the same scale as chromakey's similarity/blend, then a Gaussian feather in place of its 3x3 box.
+    du = u - key_uv[0]; dv = v - key_uv[1]
+    distance = np.sqrt((du * du + dv * dv) * (1.0 / (255.0 * 255.0 * 2)))
+    alpha = np.clip((distance - similarity) / blend, 0.0, 1.0) if blend > 0.0001 else (distance > similarity).astype(np.float32)
+    return cv2.GaussianBlur(alpha, (0, 0), feather, borderType=cv2.BORDER_REPLICATE) if feather > 0 else alpha
+
+def spill_uv_delta(u, v, key_uv):
+    # Removes the part of each pixel's chroma that points towards the key color, leaving luma and other hues alone.
+    direction = key_uv - UV_OFFSET; direction = direction / max(float(np.hypot(*direction)), 1e-6)
+    spill = np.maximum((u - UV_OFFSET[0]) * direction[0] + (v - UV_OFFSET[1]) * direction[1], 0.0)
+    return -spill * direction[0], -spill * direction[1]
+
+def checkerboard(width, height, cell=12):
+    ys, xs = np.indices((height, width))
+    board = np.where(((xs // cell) + (ys // cell)) % 2 == 0, 200, 150).astype(np.float32)
+    return np.repeat(board[..., None], 3, axis=2)
+
+class PreviewKeyer:
+    def __init__(self, frame, size):
+        # Work on a copy already scaled to the display size and keep its chroma planes, so each re-key
+        # is only the distance/blur/blend arithmetic on a canvas-sized image.
+        self.frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA) if (frame.shape[1], frame.shape[0]) != tuple(size) else frame
+        self.uv = rgb_to_uv(self.frame)
+        self.background = checkerboard(self.frame.shape[1], self.frame.shape[0])
+        self.despilled = None
+
+    def render(self, color, similarity, blend, despill=False, keyer="ffmpeg", feather=1.0):
+        if keyer == "native": return self._render_native(color, similarity, blend, despill, feather)
+        alpha = chromakey_alpha(self.uv, color, similarity, blend)[..., None]
+        if despill:
+            if self.despilled is None: self.despilled = despill_green(self.frame)
+            foreground = self.despilled
+        else: foreground = self.frame
+        return (foreground * alpha + self.background * (1.0 - alpha)).astype(np.uint8)
+
+    def _render_native(self, color, similarity, blend, despill, feather):
+        key_uv = key_color_uv_limited(color); u, v = self.uv[..., 0], self.uv[..., 1]
+        alpha = native_alpha(u, v, key_uv, similarity, blend, feather)[..., None]
+        foreground = self.frame.astype(np.float32)
+        if despill:
+            # The chroma change mapped back through the limited-range BT.601 decode matrix, so luma is kept as in the encode.
+            du, dv = spill_uv_delta(u, v, key_uv)
+            foreground = np.clip(foreground + np.stack([1.596 * dv, -0.392 * du - 0.813 * dv, 2.017 * du], axis=-1), 0, 255)
+        return (foreground * alpha + self.background * (1.0 - alpha)).astype(np.uint8)
+
+def synthetic_frame(width=480, height=270):
+    ys, xs = np.indices((height, width))
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    frame[..., 0] = xs * 255 // width; frame[..., 1] = ys * 255 // height; frame[..., 2] = 128
+    frame[height // 5:height * 3 // 4, width // 5:width * 3 // 5] = (30, 200, 60)
+    frame[height * 2 // 5:height * 3 // 5, width * 3 // 10:width // 2] = (40, 180, 80)
+    return frame
+
+def ffmpeg_alpha(ffmpeg_path, frame, color, similarity, blend):
+    height, width, _ = frame.shape
+    command = [ffmpeg_path, '-v', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f"{width}x{height}", '-i', '-',
+               '-vf', f"format=yuva444p,chromakey=color={color}:similarity={similarity}:blend={blend},alphaextract,format=gray", '-f', 'rawvideo', '-']
+    output = subprocess.run(command, input=frame.tobytes(), stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True).stdout
+    return np.frombuffer(output, dtype=np.uint8).reshape(height, width).astype(np.float32) / 255.0
+
+def compare_with_ffmpeg(ffmpeg_path, color="#1ec83c", similarity=0.15, blend=0.1, frame=None):
+    frame = synthetic_frame() if frame is None else frame
+    error = np.abs(chromakey_alpha(rgb_to_uv(frame), color, similarity, blend) - ffmpeg_alpha(ffmpeg_path, frame, color, similarity, blend))
+    return {"mean_error": float(error.mean()), "outlier_ratio": float((error > 0.05).mean())}
+
+def sample_frames(ffmpeg_path, source_path, duration, source_size, count=8, analysis_width=256):
+    # One decoding pass picks the first frame at or after the middle of each of count equal slices and scales only those to a
+    # small RGB frame. Seeking instead would land on the keyframe before each point, which with a long GOP is the same frame
+    # every time. showinfo reports each pick's pts, so a frame picked twice (a clip with fewer frames than samples) counts once.
+    # Frames nothing refers to are not decoded at all, which roughly halves the pass for long-GOP H.264; a pick then lands a
+    # frame or two late, and a decoder that would drop every frame that way gets a full pass instead.
+    width = min(analysis_width, source_size[0]); height = max(2, int(round(source_size[1] * width / source_size[0] / 2)) * 2)
+    step = duration / count if duration > 0 else 0.0
+    pick = f"select='gte(t\\,{step / 2:.6f})*(isnan(prev_selected_t)+gte(t-prev_selected_t\\,{step:.6f}))'"
+    for skip in (['-skip_frame', 'noref'], []):
+        frames = _pick_frames([ffmpeg_path, '-hide_banner', '-nostdin'] + skip + ['-i', source_path, '-map', '0:v:0', '-frames:v', str(count), '-vf', f"{pick},scale={width}:{height}:flags=area,showinfo",
+                              '-fps_mode', 'passthrough', '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-'], width * height * 3, (height, width, 3))
+        if frames: return frames
+    return []
+
+def _pick_frames(command, frame_bytes, shape):
+    result = subprocess.run(command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=engine.CREATION_FLAGS)
+    pts = re.findall(r"\bpts:\s*(-?\d+)", result.stderr.decode("utf-8", "replace"))
+    frames = {}
+    for index, stamp in enumerate(pts[:len(result.stdout) // frame_bytes]):
+        frames.setdefault(stamp, np.frombuffer(result.stdout, dtype=np.uint8, count=frame_bytes, offset=index * frame_bytes).reshape(shape))
+    return list(frames.values())
+
+def _key_hex(key_uv, luma, keyer):
+    # Picks an RGB whose chroma, as the chosen keyer converts the key color, lands on the measured UV: chromakey reads the
+    # color with full-range JPEG coefficients, the native keyer with the same limited-range matrix as the frames.
+    u, v = float(key_uv[0]) - 128.0, float(key_uv[1]) - 128.0
+    if keyer == "native": rgb = (1.164 * (luma - 16) + 1.596 * v, 1.164 * (luma - 16) - 0.392 * u - 0.813 * v, 1.164 * (luma - 16) + 2.017 * u)
+    else: rgb = (luma + 1.402 * v, luma - 0.344136 * u - 0.714136 * v, luma + 1.772 * u)
+    return "#" + "".join(f"{int(np.clip(round(c), 0, 255)):02x}" for c in rgb)
+
+def estimate_key(frames, region=None, keyer="ffmpeg"):
+    # Bins every sampled pixel (or those in the region, given as fractions x0, y0, x1, y1 of the frame) into a 256x256 UV
+    # histogram once; peak search, mean-shift and the spread quantiles then run on the histogram instead of the pixels.
+    if region:
+        x0, y0, x1, y1 = region
+        frames = [f[int(y0 * f.shape[0]):max(int(y1 * f.shape[0]), int(y0 * f.shape[0]) + 1), int(x0 * f.shape[1]):max(int(x1 * f.shape[1]), int(x0 * f.shape[1]) + 1)] for f in frames]
+    pixels = np.concatenate([f.reshape(-1, 3) for f in frames])
+    uv = np.clip(pixels @ RGB_TO_UV.T + UV_OFFSET + 0.5, 0, 255).astype(np.int32)
+    bins = uv[:, 0] * 256 + uv[:, 1]
+    histogram = np.bincount(bins, minlength=256 * 256).reshape(256, 256).astype(np.float64)
+    grid_u, grid_v = np.mgrid[0:256, 0:256].astype(np.float64)
+    # Without a region the key is the densest clearly colored cluster; greys and skin tones sit near the center.
+    candidates = histogram if region else histogram * (np.hypot(grid_u - 128.0, grid_v - 128.0) > 12.0)
+    if candidates.sum() == 0: return None
+    peak_u, peak_v = np.unravel_index(np.argmax(candidates.reshape(64, 4, 64, 4).sum(axis=(1, 3))), (64, 64))
+    center = np.array([peak_u * 4 + 1.5, peak_v * 4 + 1.5])
+    for _ in range(3):
+        weights = histogram * (np.hypot(grid_u - center[0], grid_v - center[1]) < 16.0)
+        center = np.array([(weights * grid_u).sum(), (weights * grid_v).sum()]) / weights.sum()
+    # Spread on chromakey's distance scale: similarity covers nearly all of the cluster, blend the thin tail past it.
+    distance = np.hypot(grid_u - center[0], grid_v - center[1])
+    inside = distance < 16.0
+    order = np.argsort(distance[inside]); cumulative = np.cumsum(histogram[inside][order]) / histogram[inside].sum()
+    quantile = lambda q: distance[inside][order][np.searchsorted(cumulative, q)] / (255.0 * np.sqrt(2.0))
+    similarity = quantile(0.98) + 0.01
+    blend = float(np.clip(quantile(0.999) - quantile(0.98) + 0.02, 0.02, 0.2))
+    luma_weights = (0.257, 0.504, 0.098) if keyer == "native" else (0.299, 0.587, 0.114)
+    cluster = inside.ravel()[bins]
+    luma = float(np.median(pixels[cluster] @ np.array(luma_weights, dtype=np.float32))) + (16.0 if keyer == "native" else 0.0)
+    return {"color": _key_hex(center, luma, keyer), "similarity": round(float(similarity), 3), "blend": round(blend, 3),
+            "coverage": float(cluster.mean()), "frames": len(frames)}
@@ -0,0 +1,140 @@
+import os
+import time
+import queue
+import threading
+import subprocess
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+import numpy as np
+import cv2
+import engine
+import planner
+import keyer
+
+# Worker-side handle on the shared frame ring.
+_ring = None
+
+def _attach(name):
+    global _ring
+    # Each worker keys one frame at a time on one core; the pool is what spreads frames over the CPU.
+    cv2.setNumThreads(1)
+    # Pool workers share the parent's resource tracker, so attaching here does not hand ownership of the block to the worker.
+    _ring = SharedMemory(name=name)
+
+def _key_slot(slot, width, height, settings):
+    # A slot holds one yuva444p frame as four planes: ffmpeg filled Y, U and V, the matte goes into A.
+    planes = np.ndarray((4, height, width), dtype=np.uint8, buffer=_ring.buf, offset=slot * 4 * width * height)
+    u = planes[1].astype(np.float32); v = planes[2].astype(np.float32); key_uv = np.array(settings["key_uv"], dtype=np.float32)
+    alpha = keyer.native_alpha(u, v, key_uv, settings["similarity"], settings["blend"], settings["feather"])
+    if settings["despill"]:
+        du, dv = keyer.spill_uv_delta(u, v, key_uv)
+        planes[1] = np.clip(u + du + 0.5, 0, 255); planes[2] = np.clip(v + dv + 0.5, 0, 255)
+    planes[3] = alpha * 255.0 + 0.5
+    return slot
+
+def _read_into(stream, view):
+    filled = 0
+    while filled < len(view):
+        count = stream.readinto(view[filled:])
+        if not count: break
+        filled += count
+    return filled
+
+def keyer_settings(params):
+    return {"key_uv": [float(x) for x in keyer.key_color_uv_limited(params["color"])], "similarity": float(params["similarity"]),
+            "blend": float(params["blend"]), "feather": float(params.get("feather") or 0.0), "despill": bool(params["despill"])}
+
+def _frame_limit(output_options):
+    options = list(output_options)
+    return options[options.index('-frames:v'):options.index('-frames:v') + 2] if '-frames:v' in options else []
+
+def run_native_encode(ffmpeg_path, source_path, output_path, params, passlog=None, on_output=None, on_start=None, on_progress=None, input_options=(), output_options=()):
+    # ffmpeg decodes (and denoises/scales) to raw YUV 4:4:4, a process pool writes the matte into shared memory, and a
+    # second ffmpeg encodes the YUVA frames. The encode commands come from the normal builder with keying left out.
+    info = engine.probe_video(ffmpeg_path, source_path)
+    source_size = (info["width"], info["height"])
+    width, height = planner.parse_resolution(params.get("resolution"), source_size) or source_size
+    rate = params["fps"] or info["fps"] or 30
+    decode_command = engine.build_ffmpeg_command(ffmpeg_path, source_path, '-', dict(params, output_format="raw_yuv444p", no_audio=True, source_width=info["width"], source_height=info["height"]),
+                                                 ['-v', 'error', '-nostdin'] + list(input_options), _frame_limit(output_options))
+    encode_params = dict(params, denoise=0, resolution="", hwaccel="none", source_width=width, source_height=height)
+    raw_input = ['-i', source_path, '-f', 'rawvideo', '-pix_fmt', 'yuva444p', '-s', f"{width}x{height}", '-framerate', str(rate)]
+    commands = engine.build_encode_commands(ffmpeg_path, '-', output_path, encode_params, passlog, raw_input, ['-map', '1:v:0', '-map', '0:a:0?'] + list(output_options))
+    for index, command in enumerate(commands):
+        report = (lambda progress, index=index: on_progress(dict(progress, **{"pass": index, "passes": len(commands)}))) if on_progress else None
+        return_code = run_pipeline(decode_command, command, (width, height), keyer_settings(params), on_output=on_output, on_start=on_start, on_progress=report)
+        if return_code != 0: return return_code
+    return 0
+
+def run_pipeline(decode_command, encode_command, size, settings, workers=None, on_output=None, on_start=None, on_progress=None):
+    width, height = size; plane = width * height; frame_bytes = 4 * plane
+    workers = workers or os.cpu_count() or 1
+    # Frames in flight are bounded by the ring: the decoder waits for a free slot, the encoder is fed strictly in decode order.
+    slots = 2 * workers + 2
+    ring = SharedMemory(create=True, size=frame_bytes * slots)
+    free_slots = queue.Queue(); keyed = queue.Queue(); failures = []
+    for slot in range(slots): free_slots.put(slot)
+    decoder = subprocess.Popen(decode_command, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE, creationflags=engine.CREATION_FLAGS)
+    decoder.started = time.perf_counter(); decoder.finished = None
+    if on_start: on_start(decoder)
+    pool = Pool(workers, initializer=_attach, initargs=(ring.name,))
+
+    def read_frames():
+        try:
+            while True:
+                slot = free_slots.get()
+                if slot is None: break
+                view = ring.buf[slot * frame_bytes:slot * frame_bytes + 3 * plane]
+                filled = _read_into(decoder.stdout, view); view.release()
+                if filled < 3 * plane: break
+                keyed.put(pool.apply_async(_key_slot, (slot, width, height, settings)))
+        except Exception as e: failures.append(e)
+        finally: keyed.put(None)
+
+    def write_frames(encoder):
+        try:
+            while True:
+                result = keyed.get()
+                if result is None: break
+                slot = result.get()
+                view = ring.buf[slot * frame_bytes:(slot + 1) * frame_bytes]
+                try: encoder.stdin.buffer.write(view)
+                finally: view.release()
+                free_slots.put(slot)
+        except Exception as e:
+            # The encoder went away (failed or cancelled); stop decoding too.
+            failures.append(e)
+            if decoder.poll() is None: decoder.terminate()
+        finally:
+            free_slots.put(None)
+            try: encoder.stdin.close()
+            except OSError: pass
+
+    reader = threading.Thread(target=read_frames, daemon=True); writer = None
+
+    def start_encoder(encoder):
+        nonlocal writer
+        if on_start: on_start(encoder)
+        writer = threading.Thread(target=write_frames, args=(encoder,), daemon=True); writer.start()
+
+    try:
+        reader.start()
+        return_code = engine.run_ffmpeg(encode_command, on_output=on_output, on_start=start_encoder, on_progress=on_progress, stdin=subprocess.PIPE)
+        if writer: writer.join()
+        if decoder.poll() is None: decoder.terminate()
+        reader.join()
+        decode_errors = decoder.stderr.read().decode("utf-8", "replace"); decoder_code = decoder.wait(); decoder.finished = time.perf_counter()
+        if decode_errors and on_output: on_output(decode_errors)
+        if return_code == 0 and failures and not isinstance(failures[0], OSError): raise failures[0]
+        return return_code or decoder_code
+    finally:
+        # Also reached when the encoder could not be started at all: stop the decoder and wake a reader waiting for a free
+        # slot. The pool workers inherited the decoder's pipe, so they go before it is closed; a decoder stuck writing to
+        # it then exits too, before the ring goes away.
+        if decoder.poll() is None: decoder.terminate()
+        free_slots.put(None)
+        if reader.is_alive(): reader.join()
+        pool.terminate(); pool.join()
+        decoder.stdout.close(); decoder.wait()
+        decoder.stderr.close()
+        ring.close(); ring.unlink()
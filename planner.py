@@ -0,0 +1,67 @@
+import re
+
+# GPU scalers per decoder. Frames only stay on the GPU when one of these can do useful work there;
+# otherwise the decoder hands back system-memory frames itself and no hwdownload is needed.
+GPU_SCALERS = {
+    "cuda": "scale_cuda=w={width}:h={height}:format=nv12",
+    "qsv": "scale_qsv=w={width}:h={height}:format=nv12",
+}
+
+def denoise_filter(params):
+    # nlmeans takes its strength as "s", valid from 1.0 upwards.
+    return f"nlmeans=s={max(1.0, float(params['denoise']))}"
+
+def parse_resolution(resolution, source_size=None):
+    match = re.match(r"^\s*(-?\d+)\s*[x:]\s*(-?\d+)\s*$", resolution or "")
+    if not match: return None
+    width, height = int(match.group(1)), int(match.group(2))
+    if width > 0 and height > 0: return width, height
+    if not source_size or not all(source_size) or (width <= 0 and height <= 0): return None
+    # -1 keeps the aspect ratio; -2 does too but rounds to an even number, like ffmpeg's scale filter.
+    source_width, source_height = source_size
+    if width <= 0: width = _round_for(width, height * source_width / source_height)
+    else: height = _round_for(height, width * source_height / source_width)
+    return width, height
+
+def _round_for(flag, value):
+    return int(round(value / 2) * 2) if flag == -2 else int(round(value))
+
+def _plan_scale(params, source_size, gpu_filters):
+    # Returns (input_options, head, tail): the decode options, the filters that go before denoise and keying, and those after.
+    hwaccel = params.get("hwaccel") or "none"
+    source_size = tuple(source_size) if source_size and all(source_size) else None
+    target = parse_resolution(params.get("resolution"), source_size)
+    scale = None
+    if params.get("resolution") and target != source_size:
+        scale = {"size": target, "text": params["resolution"],
+                 "downscale": bool(target and source_size and target[0] <= source_size[0] and target[1] <= source_size[1])}
+
+    input_options = ['-hwaccel', hwaccel] if hwaccel != "none" else []
+    head, tail = [], []
+    gpu_scaler = GPU_SCALERS.get(hwaccel)
+    if scale and scale["downscale"] and gpu_scaler and (gpu_filters is None or gpu_scaler.split("=")[0] in gpu_filters):
+        input_options += ['-hwaccel_output_format', hwaccel]
+        head += [gpu_scaler.format(width=scale["size"][0], height=scale["size"][1]), "hwdownload", "format=nv12"]
+    elif scale and scale["downscale"]: head.append(f"scale={scale['text']}")
+    elif scale: tail.append(f"scale={scale['text']}")
+    return input_options, head, tail
+
+def plan_filter_graph(params, source_size=None, gpu_filters=None):
+    # Builds (input_options, filters) for the requested operations. A downscale runs first so denoise and keying
+    # touch fewer pixels; upscales stay last so the key is computed at full detail; a scale to the source size is
+    # dropped. Hardware frames are kept on the GPU only as far as the GPU scaler, then downloaded once.
+    input_options, head, tail = _plan_scale(params, source_size, gpu_filters)
+    filters = list(head)
+    if params["denoise"] > 0: filters.append(denoise_filter(params))
+    # The native keyer mattes the decoded frames itself, so its decode graph stops before keying.
+    if params.get("keyer") == "native": return input_options, filters + tail
+    filters.append(f"chromakey=color={params['color']}:similarity={params['similarity']}:blend={params['blend']}")
+    if params["despill"]: filters.append("despill")
+    return input_options, filters + tail
+
+def plan_denoise_graph(params, source_size=None, gpu_filters=None, prescale=False):
+    # The cached denoise stage: (input_options, filters, scaled) for the decode, any downscale planned ahead of nlmeans,
+    # and nlmeans itself. An upscale is left to the keying encode unless prescale asks for it to be baked in as well.
+    input_options, head, tail = _plan_scale(params, source_size, gpu_filters)
+    tail = tail if prescale else []
+    return input_options, head + [denoise_filter(params)] + tail, bool(head or tail)
@@ -0,0 +1,163 @@
+import os
+import math
+import time
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import engine
+
+# CRFs the sample windows are encoded at; together they span the range VP9 stingers are normally made with.
+SAMPLE_CRFS = (20, 40, 55)
+SAMPLE_WINDOWS = 3
+# Share of the clip covered by all windows together, and the shortest window that still says something about the rate.
+SAMPLE_SHARE = 0.05
+MIN_WINDOW_SECONDS = 0.3
+MAX_CRF = 63
+# The WebM container's share of the file.
+CONTAINER_OVERHEAD = 1.01
+# Short windows miss some of the long-range cost of the full encode and predict a few percent low, so the CRF is chosen
+# for a slightly smaller file than the target.
+TARGET_MARGIN = 0.95
+# The target is a hard limit: an encode that comes out over it is redone at a higher CRF, at most this many encodes in all.
+MAX_ENCODES = 3
+
+def bitrate_bits(text):
+    text = str(text or "").strip().lower()
+    if not text: return 0
+    scale = {"k": 1000, "m": 1000000}.get(text[-1], 1)
+    return float(text[:-1] if scale > 1 else text) * scale
+
+def estimate_audio_bytes(params, info):
+    # Vorbis is VBR around the requested bitrate, so this is an estimate; PCM is exact.
+    audio_codec = engine.output_format(params)["audio_codec"]
+    if params["no_audio"] or not info["has_audio"] or not audio_codec: return 0
+    bits = 48000 * 16 * 2 if audio_codec.startswith("pcm_") else bitrate_bits(params["audio_bitrate"])
+    return bits * info["duration"] / 8
+
+def sample_windows(total_frames, fps, count=SAMPLE_WINDOWS, share=SAMPLE_SHARE):
+    # Evenly spread windows, each centered in its slice of the clip, so slow intros and busy middles are both seen.
+    # Short clips get fewer windows rather than windows below the minimum length, so sampling stays a fraction of the encode.
+    shortest = max(1, int(round(fps * MIN_WINDOW_SECONDS)))
+    count = max(1, min(count, int(round(total_frames * share / shortest))))
+    window = max(shortest, int(round(total_frames * share / count)))
+    return [(max(0, int(total_frames * (i + 0.5) / count - window / 2)), min(window, total_frames)) for i in range(count)]
+
+def predicted_bytes(points, crf):
+    # VP9 size falls roughly exponentially with CRF but not at one rate, so log(size) is interpolated between the two
+    # nearest sampled CRFs, and extended along the nearest pair outside the sampled range.
+    points = sorted(points)
+    (low, low_bytes), (high, high_bytes) = next(((a, b) for a, b in zip(points, points[1:]) if crf <= b[0]), points[-2:])
+    return math.exp(math.log(low_bytes) + (math.log(high_bytes) - math.log(low_bytes)) * (crf - low) / (high - low))
+
+def choose_crf(points, target_video_bytes):
+    # The lowest CRF predicted to fit, since a higher CRF gives a smaller file and the target is a hard limit.
+    return next((crf for crf in range(MAX_CRF + 1) if predicted_bytes(points, crf) <= target_video_bytes), MAX_CRF)
+
+def refit(points, crf, video_bytes):
+    # Scales the projections so they pass through the size a full encode actually had at crf.
+    scale = video_bytes / predicted_bytes(points, crf)
+    return [(sample_crf, size * scale) for sample_crf, size in points]
+
+def _merge_outputs(commands, source_path):
+    # Every command reads the same window; one ffmpeg decodes it once and writes all the outputs.
+    start = commands[0].index(source_path) + 1
+    return commands[0] + [arg for command in commands[1:] for arg in command[start:]]
+
+def encode_samples(ffmpeg_path, source_path, params, info, windows, crfs=SAMPLE_CRFS, on_output=None, on_start=None):
+    # Returns {crf: [(bytes, keyframe), ...]} over all windows. The windows run side by side, each as one ffmpeg per pass
+    # that encodes the window at every CRF. The native keyer cannot share a decode like that, so the samples are keyed
+    # by chromakey, whose matte is close enough for sizing. params["threads"] must be the final encode's: it sets the
+    # tile columns, which change the size, so the samples use it too even though they oversubscribe the CPU.
+    workers = min(len(windows), os.cpu_count() or 1)
+    sample_params = dict(params, keyer="ffmpeg", no_audio=True, source_width=info["width"], source_height=info["height"])
+    work_dir = tempfile.mkdtemp(prefix="stinger_sizing_")
+
+    def encode(window):
+        index, (first_frame, frame_count) = window
+        # Same half-frame-early seek as the split encoder, so each window starts on exactly the frame it was planned at.
+        seek = max(0.0, (first_frame - 0.5) / info["fps"])
+        outputs = {crf: os.path.join(work_dir, f"window{index}_crf{crf}.webm") for crf in crfs}
+        passes = [engine.build_encode_commands(ffmpeg_path, source_path, outputs[crf], dict(sample_params, crf=crf), os.path.join(work_dir, f"window{index}_crf{crf}"),
+                                               ['-ss', f"{seek:.6f}"], ['-frames:v', str(frame_count)]) for crf in crfs]
+        for commands in zip(*passes):
+            return_code = engine.run_ffmpeg(_merge_outputs(list(commands), source_path), on_output=on_output, on_start=on_start)
+            if return_code != 0: raise RuntimeError(f"Sample encode of window {index + 1} failed (exit {return_code}).")
+        return {crf: engine.packet_sizes(ffmpeg_path, path) for crf, path in outputs.items()}
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool: results = list(pool.map(encode, enumerate(windows)))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+    return {crf: [packet for result in results for packet in result[crf]] for crf in crfs}
+
+def project_size(packets, total_frames, parts=1):
+    # Every window opens with a keyframe, the full encode only has one per keyframe interval (and per segment of a split
+    # encode), so keyframes and the frames between them are averaged separately and recombined in the full encode's proportions.
+    keys = [size for size, key in packets if key]; others = [size for size, key in packets if not key]
+    key_bytes = sum(keys) / len(keys) if keys else 0; other_bytes = sum(others) / len(others) if others else key_bytes
+    key_count = min(total_frames, math.ceil(total_frames / engine.VP9_KEYFRAME_INTERVAL) + parts - 1)
+    return (key_bytes * key_count + other_bytes * (total_frames - key_count)) * CONTAINER_OVERHEAD
+
+def plan_target_size(ffmpeg_path, source_path, params, target_bytes, parts=1, on_output=None, on_start=None):
+    if engine.output_format(params)["codec"] != "libvpx-vp9": raise ValueError("A target size needs the WebM (VP9) format; the other formats have no CRF.")
+    info = engine.probe_video(ffmpeg_path, source_path)
+    source_frames = engine.count_frames(ffmpeg_path, source_path)
+    if not info["fps"] or not source_frames or not info["duration"]: raise ValueError(f"Could not probe frame rate and frame count of {source_path}.")
+    started = time.perf_counter()
+    windows = sample_windows(source_frames, info["fps"])
+    if params.get("fps"):
+        # Windows are planned in source frames; with a forced framerate they are cut and projected in output frames.
+        scale = params["fps"] / info["fps"]
+        windows = [(first_frame, max(1, round(frame_count * scale))) for first_frame, frame_count in windows]
+    total_frames = round(info["duration"] * params["fps"]) if params.get("fps") else source_frames
+    # Split encodes start every segment on a keyframe; engine.plan_segments gives short clips fewer segments in the same way.
+    parts = max(1, min(parts, total_frames // max(1, int(params.get("fps") or info["fps"]))))
+    samples = encode_samples(ffmpeg_path, source_path, params, info, windows, on_output=on_output, on_start=on_start)
+    points = [(crf, project_size(packets, total_frames, parts)) for crf, packets in samples.items()]
+    audio_bytes = estimate_audio_bytes(params, info)
+    crf = choose_crf(points, target_bytes * TARGET_MARGIN - audio_bytes)
+    return {"crf": crf, "target_size": target_bytes, "predicted_size": predicted_bytes(points, crf) + audio_bytes, "audio_size": audio_bytes,
+            "points": points, "windows": windows, "sample_time": time.perf_counter() - started}
+
+def describe_plan(plan):
+    mb = 1024 ** 2; windows = len(plan["windows"])
+    points = ", ".join(f"CRF {crf}: {size / mb:.2f} MB" for crf, size in plan["points"])
+    return (f"Target size: {len(plan['points']) * windows} sample encodes of {windows} window{'s' if windows != 1 else ''} ({sum(count for first, count in plan['windows'])} frames) "
+            f"in {plan['sample_time']:.1f}s project {points}; CRF {plan['crf']} predicts {plan['predicted_size'] / mb:.2f} MB for the {plan['target_size'] / mb:.2f} MB target.\n")
+
+def remove_output(output_path, params):
+    if engine.output_format(params)["sequence"]: shutil.rmtree(os.path.dirname(engine.output_target(output_path, params)), ignore_errors=True)
+    elif os.path.exists(output_path): os.remove(output_path)
+
+def final_threads(params, split=False, segment_count=None):
+    # The encoder threads the real encode ends up with, as engine.split_encode and the callers of engine.encode set them.
+    if params.get("threads"): return params["threads"]
+    cpu_count = os.cpu_count() or 1
+    return max(1, cpu_count // (segment_count or cpu_count)) if split else cpu_count
+
+def encode_to_target(ffmpeg_path, source_path, output_path, params, on_output=None, on_start=None, split=False, segment_count=None, **options):
+    # The sample encodes' own logs are left out; a failed sample raises with its exit code instead. An encode over the target
+    # is redone at a higher CRF, picked from the sample curve moved through the measured size; if that still does not fit,
+    # the oversized output is deleted and this raises rather than hand back a file that breaks the limit.
+    log = on_output or (lambda line: None)
+    target, mb = params["target_size_mb"] * 1024 ** 2, 1024 ** 2
+    params = dict(params, threads=final_threads(params, split, segment_count))
+    plan = plan_target_size(ffmpeg_path, source_path, params, target, parts=(segment_count or os.cpu_count() or 1) if split else 1, on_start=on_start)
+    log(describe_plan(plan))
+    points, audio_bytes, crf, predicted = plan["points"], plan["audio_size"], plan["crf"], plan["predicted_size"]
+    for attempt in range(MAX_ENCODES):
+        started = time.perf_counter()
+        return_code = engine.encode(ffmpeg_path, source_path, output_path, dict(params, crf=crf, target_size_mb=None), on_output=on_output, on_start=on_start,
+                                    split=split, segment_count=segment_count, **options)
+        if return_code != 0: return return_code
+        actual, elapsed = engine.output_size(output_path, params), time.perf_counter() - started
+        log(f"Target size: CRF {crf} predicted {predicted / mb:.2f} MB, actual {actual / mb:.2f} MB ({(actual / predicted - 1) * 100:+.1f}%), "
+            f"{'within' if actual <= target else 'OVER'} the {target / mb:.2f} MB target. Sampling took {plan['sample_time']:.1f}s, the encode {elapsed:.1f}s.\n")
+        if actual <= target: return 0
+        if crf >= MAX_CRF or attempt == MAX_ENCODES - 1: break
+        # The output's own packets separate the video from the audio, so both estimates are replaced by measurements.
+        video_bytes = sum(size for size, key in engine.packet_sizes(ffmpeg_path, output_path)) * CONTAINER_OVERHEAD
+        audio_bytes = max(0.0, actual - video_bytes); points = refit(points, crf, video_bytes)
+        crf = max(crf + 1, choose_crf(points, target * TARGET_MARGIN - audio_bytes)); predicted = predicted_bytes(points, crf) + audio_bytes
+    remove_output(output_path, params)
+    raise RuntimeError(f"The output was {actual / mb:.2f} MB at CRF {crf}, over the {target / mb:.2f} MB target, so it was deleted; allow a larger size, a lower resolution or framerate, or no audio.")
@@ -0,0 +1,17 @@
+import time
+
+class StartupTimer:
+    # Splits the time from process start into named phases; each mark closes the phase that began at the previous one.
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.last = self.started
+        self.phases = []
+
+    def mark(self, name):
+        now = time.perf_counter()
+        self.phases.append((name, now - self.last)); self.last = now
+
+    def report(self):
+        lines = [f"{name:<32}{seconds * 1000:8.1f} ms" for name, seconds in self.phases]
+        lines.append(f"{'total':<32}{(self.last - self.started) * 1000:8.1f} ms")
+        return "\n".join(lines)
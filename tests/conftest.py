@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The app is a set of flat modules next to this folder, not an installed package.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
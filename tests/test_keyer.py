@@ -0,0 +1,13 @@
+import shutil
+import pytest
+import keyer
+
+FFMPEG = shutil.which("ffmpeg")
+
+# The preview matte must track ffmpeg's chromakey closely; the only expected mismatches are single pixels on hard edges.
+@pytest.mark.skipif(FFMPEG is None, reason="ffmpeg is not installed")
+@pytest.mark.parametrize("similarity, blend", [(0.1, 0.0), (0.15, 0.1), (0.3, 0.2)])
+def test_preview_matte_matches_ffmpeg(similarity, blend):
+    result = keyer.compare_with_ffmpeg(FFMPEG, similarity=similarity, blend=blend)
+    assert result["mean_error"] < 0.01
+    assert result["outlier_ratio"] < 0.01
@@ -0,0 +1,91 @@
+import pytest
+import planner
+
+KEY = "chromakey=color=#00ff00:similarity=0.15:blend=0.1"
+
+def make_params(**overrides):
+    params = {"color": "#00ff00", "similarity": 0.15, "blend": 0.1, "denoise": 0.0, "despill": False, "resolution": "", "hwaccel": "none", "keyer": "ffmpeg"}
+    params.update(overrides)
+    return params
+
+@pytest.mark.parametrize("resolution, source_size, expected", [
+    ("1920x1080", None, (1920, 1080)),
+    (" 1280 : 720 ", None, (1280, 720)),
+    ("1280x-1", (1920, 1080), (1280, 720)),
+    ("-1x720", (1920, 1080), (1280, 720)),
+    ("-2x301", (1920, 1080), (536, 301)),
+    ("-1x301", (1920, 1080), (535, 301)),
+    ("1280x-1", None, None),
+    ("-1x-1", (1920, 1080), None),
+    ("", (1920, 1080), None),
+    ("big", (1920, 1080), None),
+])
+def test_parse_resolution(resolution, source_size, expected):
+    assert planner.parse_resolution(resolution, source_size) == expected
+
+def test_no_operations_keys_only():
+    assert planner.plan_filter_graph(make_params(), (1920, 1080)) == ([], [KEY])
+
+def test_downscale_runs_before_denoise_and_keying():
+    params = make_params(resolution="1280x720", denoise=4, despill=True)
+    assert planner.plan_filter_graph(params, (3840, 2160)) == ([], ["scale=1280x720", "nlmeans=s=4.0", KEY, "despill"])
+
+def test_downscale_with_aspect_flag_runs_first():
+    assert planner.plan_filter_graph(make_params(resolution="-2x720"), (3840, 2160))[1] == ["scale=-2x720", KEY]
+
+def test_upscale_stays_last():
+    params = make_params(resolution="3840x2160", denoise=2, despill=True)
+    assert planner.plan_filter_graph(params, (1920, 1080))[1] == ["nlmeans=s=2.0", KEY, "despill", "scale=3840x2160"]
+
+def test_unknown_source_size_keeps_scale_last():
+    assert planner.plan_filter_graph(make_params(resolution="1280x720"), None)[1] == [KEY, "scale=1280x720"]
+
+@pytest.mark.parametrize("resolution", ["1920x1080", "1920:1080", "-1x1080", "1920x-2"])
+def test_scale_to_source_size_is_dropped(resolution):
+    assert planner.plan_filter_graph(make_params(resolution=resolution), (1920, 1080))[1] == [KEY]
+
+@pytest.mark.parametrize("hwaccel, scaler", [("cuda", "scale_cuda"), ("qsv", "scale_qsv")])
+def test_gpu_downscale_stays_on_the_gpu(hwaccel, scaler):
+    params = make_params(resolution="1280x720", hwaccel=hwaccel, denoise=1)
+    input_options, filters = planner.plan_filter_graph(params, (3840, 2160), [scaler, "nlmeans"])
+    assert input_options == ['-hwaccel', hwaccel, '-hwaccel_output_format', hwaccel]
+    assert filters == [f"{scaler}=w=1280:h=720:format=nv12", "hwdownload", "format=nv12", "nlmeans=s=1.0", KEY]
+
+@pytest.mark.parametrize("hwaccel", ["cuda", "qsv"])
+def test_gpu_downscale_without_gpu_scaler_falls_back_to_cpu(hwaccel):
+    input_options, filters = planner.plan_filter_graph(make_params(resolution="1280x720", hwaccel=hwaccel), (3840, 2160), ["scale", "nlmeans"])
+    assert input_options == ['-hwaccel', hwaccel]
+    assert filters == ["scale=1280x720", KEY]
+
+@pytest.mark.parametrize("hwaccel", ["cuda", "qsv"])
+def test_gpu_decode_without_scale_downloads_nothing(hwaccel):
+    input_options, filters = planner.plan_filter_graph(make_params(hwaccel=hwaccel), (1920, 1080), ["scale_cuda", "scale_qsv"])
+    assert input_options == ['-hwaccel', hwaccel]
+    assert "hwdownload" not in filters
+
+def test_gpu_upscale_runs_on_the_cpu_after_keying():
+    input_options, filters = planner.plan_filter_graph(make_params(resolution="3840x2160", hwaccel="cuda"), (1920, 1080), ["scale_cuda"])
+    assert input_options == ['-hwaccel', 'cuda']
+    assert filters == [KEY, "scale=3840x2160"]
+
+def test_decoder_without_gpu_scaler_keeps_software_frames():
+    input_options, filters = planner.plan_filter_graph(make_params(resolution="1280x720", hwaccel="d3d11va"), (3840, 2160))
+    assert input_options == ['-hwaccel', 'd3d11va']
+    assert filters == ["scale=1280x720", KEY]
+
+def test_native_keyer_stops_before_keying():
+    params = make_params(keyer="native", denoise=3, despill=True, resolution="1280x720")
+    assert planner.plan_filter_graph(params, (3840, 2160)) == ([], ["scale=1280x720", "nlmeans=s=3.0"])
+    assert planner.plan_filter_graph(make_params(keyer="native", resolution="3840x2160"), (1920, 1080))[1] == ["scale=3840x2160"]
+    assert planner.plan_filter_graph(make_params(keyer="native"), (1920, 1080))[1] == []
+
+def test_denoise_graph_bakes_in_downscales_only():
+    params = make_params(denoise=3, resolution="1280x720")
+    assert planner.plan_denoise_graph(params, (3840, 2160)) == ([], ["scale=1280x720", "nlmeans=s=3.0"], True)
+    assert planner.plan_denoise_graph(make_params(denoise=3, resolution="3840x2160"), (1920, 1080)) == ([], ["nlmeans=s=3.0"], False)
+    assert planner.plan_denoise_graph(make_params(denoise=3, resolution="3840x2160"), (1920, 1080), prescale=True) == ([], ["nlmeans=s=3.0", "scale=3840x2160"], True)
+
+def test_denoise_graph_keeps_the_hardware_decode():
+    input_options, filters, scaled = planner.plan_denoise_graph(make_params(denoise=3, resolution="1280x720", hwaccel="cuda"), (3840, 2160), ["scale_cuda"])
+    assert input_options == ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+    assert filters == ["scale_cuda=w=1280:h=720:format=nv12", "hwdownload", "format=nv12", "nlmeans=s=3.0"] and scaled